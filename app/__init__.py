@@ -1,35 +1,187 @@
-from flask import Flask
 import os
-from dotenv import load_dotenv
+import threading
+import time
+from flask import Flask, request
+from models import db
+from utils import initialize_database, init_worker, set_logger
+from config import setup_logger, Config
+from middleware import ProxyFix, ConcurrencyLimiter, RequestTracker, get_real_ip
+from startup import StartupTimer, warm_up
+from db_routing import READ_BIND, configure_read_bind, install_read_only_guard
+from sharding import configure_shard_binds, entry_shards
+from health import ReadinessCheck, install_pool_stats
 
-def create_app():
+# Serialises worker_init between a server hook and early requests
+_worker_lock = threading.Lock()
+
+def create_app(test_config=None):
     """Create and configure the Flask application"""
-    app = Flask(__name__, 
+    timer = StartupTimer()
+
+    # Create and configure the app
+    app = Flask(__name__,
                 template_folder='../templates',
                 static_folder='../static')
-    
-    # Load environment variables
-    load_dotenv()
-    
-    # App configuration
-    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev_key')
-    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URI', 'sqlite:///strings.db')
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    
-    # Register blueprints
-    from app.main_routes import main_bp
-    app.register_blueprint(main_bp)
-    
-    # Register mobile routes
-    from app.mobile_routes import mobile_bp
-    app.register_blueprint(mobile_bp)
-    
-    # Initialize extensions
-    from app.extensions import db
+
+    # Load configuration
+    with timer.phase('config'):
+        if test_config is None:
+            app.config.from_object(Config)
+        else:
+            app.config.update(test_config)
+
+    # Setup logging
+    with timer.phase('logging'):
+        logger = setup_logger()
+        set_logger(logger)
+
+    # Add ProxyFix middleware if app is behind a proxy
+    if app.config.get('BEHIND_PROXY', False):
+        app.wsgi_app = ProxyFix(app.wsgi_app, app.config.get('PROXY_HEADERS'))
+        logger.info("ProxyFix middleware enabled")
+
+    # Busy worker threads, for the stats endpoint
+    tracker = RequestTracker(app.wsgi_app)
+    app.wsgi_app = tracker
+    app.extensions['request_tracker'] = tracker
+
+    # Outermost, so saturated requests are rejected before any other work
+    if app.config.get('LOAD_SHEDDING', False):
+        limiter = ConcurrencyLimiter(
+            app.wsgi_app,
+            app.config.get('CONCURRENCY_LIMITS', {}),
+            queue_timeout=app.config.get('QUEUE_TIMEOUT', 0.5),
+            retry_after=app.config.get('RETRY_AFTER', 2),
+            logger=logger
+        )
+        app.wsgi_app = limiter
+        app.extensions['concurrency_limiter'] = limiter
+        logger.info(f"Load shedding enabled with limits: {limiter.stats()}")
+
+        threads = app.config.get('SERVER_THREADS', 16)
+        total = sum(app.config.get('CONCURRENCY_LIMITS', {}).values())
+        if total > threads:
+            logger.warning(f"Concurrency limits add up to {total} but SERVER_THREADS is {threads}; "
+                           f"requests will queue in the server instead of being shed")
+
+    # Add global function to get real IP
+    app.jinja_env.globals.update(get_real_ip=get_real_ip)
+
+    # Add request logging for IP addresses
+    @app.before_request
+    def log_request_info():
+        original_ip = request.remote_addr
+        real_ip = get_real_ip(request)
+
+        # Only log if different (indicating proxy is working)
+        if original_ip != real_ip:
+            logger.info(f"Request from IP: {real_ip} (via proxy: {original_ip})")
+
+        # Store the real IP in request for other functions to use
+        request.real_ip = real_ip
+
+    # Import and register blueprints, setting their loggers
+    with timer.phase('blueprints'):
+        from routes.main import main_bp, set_logger as set_main_logger
+        from routes.admin import admin_bp, set_logger as set_admin_logger
+        from routes.errors import errors_bp, set_logger as set_errors_logger
+        from routes.health import health_bp
+        from app.mobile_routes import mobile_bp
+        from live_feed import set_logger as set_feed_logger
+        from search import set_logger as set_search_logger
+        from rollups import set_logger as set_rollups_logger
+
+        set_main_logger(logger)
+        set_admin_logger(logger)
+        set_errors_logger(logger)
+        set_feed_logger(logger)
+        set_search_logger(logger)
+        set_rollups_logger(logger)
+
+        app.register_blueprint(main_bp)
+        app.register_blueprint(admin_bp)
+        app.register_blueprint(errors_bp)
+        app.register_blueprint(health_bp)
+        app.register_blueprint(mobile_bp)
+
+    # Optional read bind; must be in SQLALCHEMY_BINDS before init_app
+    read_uri = configure_read_bind(app.config)
+    shard_count = configure_shard_binds(app.config)
     db.init_app(app)
-    
-    # Create database tables
+    app.teardown_appcontext(entry_shards.close_sessions)
     with app.app_context():
-        db.create_all()
-    
+        install_pool_stats(app)
+    app.extensions['readiness'] = ReadinessCheck(timeout=app.config.get('READY_TIMEOUT', 1.0))
+    if shard_count > 1:
+        logger.info(f"String entries sharded across {shard_count} databases")
+    if read_uri:
+        with app.app_context():
+            install_read_only_guard(db.engines[READ_BIND])
+        logger.info("Read queries routed to the read bind")
+
+    # Maintenance commands (flask --app app maint ...)
+    from commands import register_commands
+    register_commands(app)
+
+    # One-time phase; skip with INIT_DB=False when the database is prepared separately
+    if app.config.get('INIT_DB', True):
+        with timer.phase('database'):
+            initialize_database(app)
+
+    # The factory may run in a preloading master before fork: close its
+    # pooled connections and leave threads and caches to worker_init
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+    timer.finish()
+    app.extensions['startup_timings'] = timer.as_dict()
+    app.extensions['worker_pid'] = None
+    logger.info(timer.summary())
+
+    # Per-worker phase, as a fallback for forking servers that don't call
+    # worker_init in each worker themselves
+    @app.before_request
+    def ensure_worker_init():
+        if app.extensions['worker_pid'] != os.getpid():
+            worker_init(app)
+
+    # Startup notification
+    @app.before_first_request
+    def before_first_request():
+        idle = time.perf_counter() - timer.finished
+        logger.info(f"First request received {idle:.3f}s after startup. Application is now running.")
+
     return app
+
+def worker_init(app):
+    """
+    Per-worker startup: the consumed-id bitmap, background jobs and the
+    optional warm-up. wsgi.py and the ASGI lifespan call it before serving;
+    in workers forked afterwards (e.g. Gunicorn --preload) it runs again,
+    from a post_worker_init hook or else the worker's first request. Only
+    the first call in each process does anything.
+    """
+    with _worker_lock:
+        if app.extensions['worker_pid'] == os.getpid():
+            return
+        if app.extensions['worker_pid'] is not None:
+            # Forked from a process that already ran it: drop the inherited
+            # pooled connections without closing them under the parent
+            with app.app_context():
+                for engine in db.engines.values():
+                    engine.dispose(close=False)
+
+        logger = setup_logger()
+        timer = StartupTimer()
+        with timer.phase('worker'):
+            init_worker(app)
+
+        if app.config.get('WARM_UP', False):
+            with timer.phase('warm_up'):
+                warm_up(app, logger)
+
+        timer.finish()
+        app.extensions['startup_timings'].update(timer.as_dict())
+        app.extensions['worker_pid'] = os.getpid()
+        logger.info(f"Worker {os.getpid()}: {timer.summary()}")
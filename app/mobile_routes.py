@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, request, jsonify, redirect, url_for
+from flask import Blueprint, render_template, request, jsonify, redirect, url_for, current_app
 
 mobile_bp = Blueprint('mobile', __name__, url_prefix='/mobile')
 
@@ -18,12 +18,17 @@ def profile():
     """Mobile profile route"""
     return render_template('mobile/profile.html')
 
-# API endpoints for mobile
-@mobile_bp.route('/api/stats')
-def get_stats():
-    """Get user stats for mobile UI"""
-    # Mock data - in production, fetch from database
-    stats = {
+@mobile_bp.route('/sw.js')
+def service_worker():
+    """Service worker script; served from /mobile/ so its scope covers the mobile pages"""
+    response = current_app.send_static_file('js/mobile_sw.js')
+    # Browsers must always revalidate the worker itself, or updates never land
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# Mock data - in production, fetch from database
+def stats_payload():
+    return {
         "gamesPlayed": 42,
         "wins": 28,
         "winRate": "67%",
@@ -34,18 +39,48 @@ def get_stats():
             {"name": "Space Invaders", "result": "win", "date": "3 days ago"}
         ]
     }
-    return jsonify(stats)
 
-@mobile_bp.route('/api/games')
-def get_games():
-    """Get available games for mobile UI"""
-    # Mock data - in production, fetch from database
-    games = [
+def games_payload():
+    return [
         {"id": 1, "title": "Adventure Quest", "players": 4, "status": "active"},
         {"id": 2, "title": "Space Invaders", "players": 2, "status": "waiting"},
         {"id": 3, "title": "Puzzle Master", "players": 3, "status": "completed"}
     ]
-    return jsonify({"games": games})
+
+def profile_payload():
+    return {
+        "username": "alexj",
+        "email": "alex@example.com",
+        "location": "New York, USA",
+        "bio": "Game enthusiast and competitive player. I love strategy games and puzzles!",
+        "avatar": "https://via.placeholder.com/120"
+    }
+
+def conditional_json(payload):
+    """JSON response with an ETag, so revalidation costs a 304 when nothing changed"""
+    response = jsonify(payload)
+    response.add_etag()
+    return response.make_conditional(request)
+
+# API endpoints for mobile
+@mobile_bp.route('/api/bootstrap')
+def get_bootstrap():
+    """Stats, games and profile in one response for the initial page load"""
+    return conditional_json({
+        "stats": stats_payload(),
+        "games": games_payload(),
+        "profile": profile_payload()
+    })
+
+@mobile_bp.route('/api/stats')
+def get_stats():
+    """Get user stats for mobile UI"""
+    return conditional_json(stats_payload())
+
+@mobile_bp.route('/api/games')
+def get_games():
+    """Get available games for mobile UI"""
+    return conditional_json({"games": games_payload()})
 
 @mobile_bp.route('/api/profile', methods=['GET', 'POST'])
 def update_profile():
@@ -56,12 +91,4 @@ def update_profile():
         # Mock successful update
         return jsonify({"success": True, "message": "Profile updated successfully"})
     else:
-        # Mock profile data
-        profile = {
-            "username": "alexj",
-            "email": "alex@example.com",
-            "location": "New York, USA",
-            "bio": "Game enthusiast and competitive player. I love strategy games and puzzles!",
-            "avatar": "https://via.placeholder.com/120"
-        }
-        return jsonify(profile)
+        return conditional_json(profile_payload())
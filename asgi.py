@@ -0,0 +1,5 @@
+from asgi_app import create_asgi_app
+
+# Optional entry point for ASGI servers (see asgi_app.py), e.g.
+#     uvicorn asgi:application --host 127.0.0.1 --port 8000
+application = create_asgi_app()
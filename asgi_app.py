@@ -0,0 +1,323 @@
+"""
+ASGI front end: async public routes, everything else on the WSGI app.
+
+`/`, `/view/<id>` and `/mobile/api/*` are served by the coroutines in
+routes/public_async.py on the event loop, so requests waiting on SQLite
+or the log don't each hold a thread and concurrency is no longer capped
+by the thread count. All other routes (admin, static files, the live
+feed) run the unchanged WSGI app, with its middleware, on a pool of
+SERVER_THREADS threads.
+
+    uvicorn asgi:application --host 127.0.0.1 --port 8000
+
+Needs the optional packages in requirements-asgi.txt.
+"""
+
+import asyncio
+import contextvars
+import io
+import logging
+import queue
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import QueueHandler, QueueListener
+from flask import request_started
+from app import create_app, worker_init
+from async_db import AsyncEntryStore
+from health import PoolStats
+from middleware import ProxyFix
+from routes.public_async import ASYNC_VIEWS, set_logger as set_async_logger
+
+# Only these paths are considered for the async handlers
+ASYNC_PREFIXES = ('/view/', '/mobile/api/')
+
+def build_environ(scope, body):
+    """WSGI environ for an ASGI HTTP scope and its (already read) body"""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else f'HTTP_{name}'
+        value = value.decode('latin-1')
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    if body:
+        # A chunked request body arrives without Content-Length
+        environ.setdefault('CONTENT_LENGTH', str(len(body)))
+    return environ
+
+def encode_headers(headers):
+    return [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+class AsyncLimiter:
+    """
+    In-flight cap for the async routes, the event-loop counterpart of
+    middleware.ConcurrencyLimiter: a request that can't get a slot within
+    queue_timeout is answered with a 503 and Retry-After.
+    """
+
+    def __init__(self, limit, queue_timeout=0.5, retry_after=2):
+        self.limit = limit
+        self.queue_timeout = queue_timeout
+        self.retry_after = str(retry_after)
+        self._slots = asyncio.Semaphore(limit)
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.waiting = 0
+        self.served = 0
+        self.shed = 0
+
+    def stats(self):
+        # Only touched from the event loop thread, so no lock is needed
+        return {'limit': self.limit, 'in_flight': self.in_flight, 'peak_in_flight': self.peak_in_flight,
+                'waiting': self.waiting, 'served': self.served, 'shed': self.shed}
+
+    async def acquire(self):
+        """True once a slot is held; False if the request should be shed"""
+        if self._slots.locked():
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.shed += 1
+                return False
+            finally:
+                self.waiting -= 1
+        else:
+            await self._slots.acquire()
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+        self.served += 1
+        self._slots.release()
+
+class AsgiApplication:
+    def __init__(self, flask_app, store, threads=4, limiter=None):
+        self.flask_app = flask_app
+        self.store = store
+        self.limiter = limiter
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='wsgi')
+        self.log_listener = None
+        proxy_headers = flask_app.config.get('PROXY_HEADERS')
+        self.proxy_fix = ProxyFix(None, proxy_headers) if flask_app.config.get('BEHIND_PROXY', False) else None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+
+        body = await read_body(receive)
+        if body is None:
+            return
+        environ = build_environ(scope, body)
+
+        path = scope['path']
+        if path == '/' or path.startswith(ASYNC_PREFIXES):
+            if self.limiter is not None and not await self.limiter.acquire():
+                return await self.send_shed(send)
+            try:
+                if await self.handle_async(environ, send):
+                    return
+            finally:
+                if self.limiter is not None:
+                    self.limiter.release()
+        await self.handle_wsgi(environ, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                # Runs in the serving process, after the server has forked
+                await asyncio.get_running_loop().run_in_executor(self.executor, worker_init, self.flask_app)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.store.dispose()
+                self.executor.shutdown(wait=False)
+                if self.log_listener is not None:
+                    self.log_listener.stop()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def send_shed(self, send):
+        body = b"Service temporarily overloaded, please retry shortly."
+        await send({'type': 'http.response.start', 'status': 503, 'headers': encode_headers([
+            ('Content-Type', 'text/plain; charset=utf-8'),
+            ('Content-Length', str(len(body))),
+            ('Retry-After', self.limiter.retry_after),
+        ])})
+        await send({'type': 'http.response.body', 'body': body})
+
+    # ------ Async routes ------
+
+    async def handle_async(self, environ, send):
+        """
+        Dispatch like Flask.wsgi_app, awaiting the async view. Returns False
+        without responding when the URL doesn't map to an async view (e.g.
+        a 404 or 405), so the WSGI app answers it.
+        """
+        app = self.flask_app
+        if self.proxy_fix is not None:
+            self.proxy_fix.set_real_ip(environ)
+
+        ctx = app.request_context(environ)
+        error = None
+        try:
+            try:
+                ctx.push()
+                rule = ctx.request.url_rule
+                view = ASYNC_VIEWS.get(rule.endpoint) if rule is not None else None
+                if view is None:
+                    return False
+                try:
+                    request_started.send(app)
+                    rv = app.preprocess_request()
+                    if rv is None:
+                        rv = await view(**ctx.request.view_args)
+                except Exception as e:
+                    rv = app.handle_user_exception(e)
+                response = app.finalize_request(rv)
+            except Exception as e:
+                error = e
+                response = app.handle_exception(e)
+
+            app_iter, status, headers = response.get_wsgi_response(environ)
+            try:
+                content = b''.join(app_iter)
+            finally:
+                response.close()
+        finally:
+            ctx.pop(error)
+
+        await send({'type': 'http.response.start', 'status': int(status.split(' ', 1)[0]),
+                    'headers': encode_headers(headers)})
+        await send({'type': 'http.response.body', 'body': content})
+        return True
+
+    # ------ WSGI fallback ------
+
+    async def handle_wsgi(self, environ, receive, send):
+        """Run the WSGI app in the thread pool, streaming its body chunk by chunk"""
+        loop = asyncio.get_running_loop()
+        response = {'started': False}
+
+        async def send_body(data, more_body=True):
+            # Headers go out with the first body message (PEP 3333)
+            if not response['started']:
+                await send({'type': 'http.response.start', 'status': response['status'],
+                            'headers': encode_headers(response['headers'])})
+                response['started'] = True
+            await send({'type': 'http.response.body', 'body': data, 'more_body': more_body})
+
+        def write(data):
+            # PEP 3333's imperative write(), called on the worker thread; blocks until sent
+            asyncio.run_coroutine_threadsafe(send_body(data), loop).result()
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response['started']:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = headers
+            return write
+
+        disconnected = asyncio.Event()
+
+        async def watch_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            disconnected.set()
+
+        # Consecutive calls may land on different threads; running them all in
+        # one context keeps the request's context variables (e.g. the Flask
+        # context pushed by a streamed template) visible to every chunk
+        context = contextvars.copy_context()
+        watcher = None
+        app_iter = None
+        try:
+            watcher = asyncio.ensure_future(watch_disconnect())
+            app_iter = await loop.run_in_executor(self.executor, context.run, self.flask_app, environ, start_response)
+            chunks = iter(app_iter)
+            while not disconnected.is_set():
+                chunk = await loop.run_in_executor(self.executor, context.run, next, chunks, None)
+                if chunk is None:
+                    await send_body(b'', more_body=False)
+                    break
+                if chunk:
+                    await send_body(chunk)
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            if hasattr(app_iter, 'close'):
+                # Releases limiter slots and request tracking; may block briefly
+                await loop.run_in_executor(self.executor, context.run, app_iter.close)
+
+def install_queue_logging(logger):
+    """
+    Hand log records to a background thread, so file writes never block
+    the event loop. Returns the listener (stop it on shutdown), or None if
+    already installed.
+    """
+    if not logger.handlers or any(isinstance(handler, QueueHandler) for handler in logger.handlers):
+        return None
+    records = queue.SimpleQueue()
+    listener = QueueListener(records, *logger.handlers, respect_handler_level=True)
+    logger.handlers = [QueueHandler(records)]
+    listener.start()
+    return listener
+
+def create_asgi_app(test_config=None):
+    """Create the Flask app and wrap it for an ASGI server"""
+    flask_app = create_app(test_config)
+    config = flask_app.config
+    logger = logging.getLogger('string_transformer')
+    set_async_logger(logger)
+
+    store = AsyncEntryStore(flask_app, pool_size=config.get('ASGI_DB_POOL_SIZE', 8))
+    flask_app.extensions['async_entries'] = store
+    pools = flask_app.extensions.setdefault('pool_stats', {})
+    pools['async_primary'] = PoolStats(store.primary.sync_engine)
+    if store.count > 1:
+        for shard, engine in enumerate(store.shards):
+            pools[f'async_shard_{shard}'] = PoolStats(engine.sync_engine)
+
+    limiter = None
+    if config.get('LOAD_SHEDDING', False):
+        limiter = AsyncLimiter(config.get('ASGI_CONCURRENCY', 256),
+                               queue_timeout=config.get('QUEUE_TIMEOUT', 0.5),
+                               retry_after=config.get('RETRY_AFTER', 2))
+        flask_app.extensions['async_limiter'] = limiter
+
+    application = AsgiApplication(flask_app, store, threads=config.get('SERVER_THREADS', 16), limiter=limiter)
+    application.log_listener = install_queue_logging(logger)
+    logger.info(f"ASGI mode: async public routes, {config.get('SERVER_THREADS', 16)} threads for the rest")
+    return application
@@ -0,0 +1,97 @@
+"""
+Non-blocking database access for the ASGI entry point (asgi.py).
+
+Covers the few operations the public routes need (pattern lookup, entry
+find/create/claim) on SQLAlchemy's asyncio extension, so a request
+waiting on SQLite yields the event loop instead of holding a thread.
+Engines are built from the URLs of the sync engines, so both modes open
+the same files, including the entry shards, and route entries the same
+way as entry_shards.
+
+Needs the optional packages in requirements-asgi.txt (aiosqlite and
+greenlet for SQLite).
+"""
+
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from models import db, StringEntry, StringPair, canonical_key
+from sharding import entry_shards
+
+# Async driver for each sync backend
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'mysql': 'mysql+aiomysql',
+}
+
+def async_url(url):
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for '{backend}' databases")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+class AsyncEntryStore:
+    """Async counterpart of the entry_shards operations used by the public routes"""
+
+    def __init__(self, app, pool_size=8):
+        options = {'pool_size': pool_size, 'max_overflow': 0}
+        with app.app_context():
+            self.count = entry_shards.count
+            self.primary = create_async_engine(async_url(db.engine.url), **options)
+            if entry_shards.enabled:
+                self.shards = [create_async_engine(async_url(engine.url), **options)
+                               for engine in entry_shards.engines()]
+            else:
+                self.shards = [self.primary]
+
+    def engines(self):
+        return [self.primary] + [engine for engine in self.shards if engine is not self.primary]
+
+    async def dispose(self):
+        for engine in self.engines():
+            await engine.dispose()
+
+    # ------ Routing ------
+
+    def session(self, shard):
+        """New session on one shard; use as `async with`"""
+        return AsyncSession(bind=self.shards[shard], expire_on_commit=False)
+
+    def session_for_ip(self, ip_address):
+        return self.session(entry_shards.shard_for_ip(ip_address))
+
+    def session_for_id(self, entry_id):
+        return self.session(entry_id % self.count)
+
+    # ------ Operations ------
+
+    async def transform_string(self, input_string):
+        """Output pattern for input_string, or None; see utils.transform_string"""
+        async with self.primary.connect() as conn:
+            return await conn.scalar(
+                sa.select(StringPair.output_pattern)
+                .filter_by(input_key=canonical_key(input_string)).limit(1)
+            )
+
+    async def find(self, session, ip_address, **filters):
+        """First entry for an IP matching filters, from the IP's shard session"""
+        return await session.scalar(
+            sa.select(StringEntry).filter_by(ip_address=ip_address, **filters).limit(1)
+        )
+
+    async def create(self, session, **values):
+        """Insert and commit a new entry on session's shard; returns its id"""
+        if self.count <= 1:
+            entry = StringEntry(**values)
+            session.add(entry)
+            await session.commit()
+            return entry.id
+
+        # Same id scheme as EntryShards.create: next id congruent to the shard
+        shard = entry_shards.shard_for_ip(values['ip_address'])
+        next_id = sa.select(
+            sa.func.coalesce(sa.func.max(StringEntry.id), shard) + self.count
+        ).scalar_subquery()
+        result = await session.execute(sa.insert(StringEntry).values(id=next_id, **values))
+        await session.commit()
+        return result.inserted_primary_key[0]
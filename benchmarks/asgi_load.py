@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Load test: how far concurrency scales under a fixed memory budget with
+the WSGI (Waitress threads) and ASGI (asgi.py on Uvicorn) entry points.
+
+Each server runs in its own process on a throwaway SQLite database. For
+every concurrency level, N clients loop over the public flow (POST / from
+a fresh client IP, follow the redirect to /view/<id>, fetch
+/mobile/api/bootstrap) for a fixed time. Waitress gets one thread (and
+one pooled connection) per client, since that is what a waiting request
+costs there; Uvicorn keeps one event loop and ASGI_DB_POOL_SIZE
+connections. The report shows throughput, latency and the server's peak
+RSS per level, flagging levels whose RSS exceeds --memory-mb.
+
+    python benchmarks/asgi_load.py --levels 8,32,128,512 --duration 10 --memory-mb 120
+
+Load shedding is disabled on both servers so the limits being measured
+are the servers', not the configured LIMIT_* values.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from replay import percentile
+
+MODES = ('wsgi', 'asgi')
+
+# ------ Server ------
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+# Waitress server for one thread per client; the connection pool is sized
+# to match, as a deployment with that many threads would be
+WSGI_SERVER = """
+import sys
+import waitress
+from app import create_app
+from config import Config
+
+port, threads = int(sys.argv[1]), int(sys.argv[2])
+config = {name: getattr(Config, name) for name in dir(Config) if name.isupper()}
+config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_size': threads, 'max_overflow': 0}
+waitress.serve(create_app(config), host='127.0.0.1', port=port, threads=threads,
+               connection_limit=threads * 2 + 100, backlog=threads * 2 + 100,
+               trusted_proxy='127.0.0.1', trusted_proxy_headers={'x-forwarded-for'}, _quiet=True)
+"""
+
+def server_command(mode, port, concurrency):
+    if mode == 'wsgi':
+        return [sys.executable, '-c', WSGI_SERVER, str(port), str(concurrency)]
+    return [sys.executable, '-m', 'uvicorn', 'asgi:application', '--host', '127.0.0.1',
+            '--port', str(port), '--log-level', 'warning', '--no-access-log',
+            '--backlog', str(concurrency * 2 + 100)]
+
+def rss_kb(pid, field='VmRSS'):
+    """Resident set size (or peak, with VmHWM) of a process, from /proc (Linux only)"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+class Server:
+    def __init__(self, mode, concurrency, db_dir):
+        self.port = free_port()
+        env = dict(os.environ,
+                   DATABASE_URI=f"sqlite:///{os.path.join(db_dir, f'{mode}-{concurrency}.db')}",
+                   SECRET_KEY='load-test', SECURE_COOKIES='False', BEHIND_PROXY='True',
+                   LOAD_SHEDDING='False', ROLLUP_INTERVAL='0', LOG_DIR=db_dir)
+        if mode == 'wsgi':
+            env['SERVER_THREADS'] = str(concurrency)
+        self.process = subprocess.Popen(server_command(mode, self.port, concurrency), cwd=ROOT, env=env,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        self.peak_rss = 0
+        self._sampling = True
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+
+    def wait_ready(self, timeout=30.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"server exited: {self.process.stderr.read().decode()[-2000:]}")
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{self.port}/healthz', timeout=1):
+                    break
+            except OSError:
+                time.sleep(0.1)
+        else:
+            raise RuntimeError("server did not become ready")
+        self.idle_rss = rss_kb(self.process.pid)
+        self._sampler.start()
+
+    def _sample(self):
+        while self._sampling:
+            self.peak_rss = max(self.peak_rss, rss_kb(self.process.pid) or 0)
+            time.sleep(0.05)
+
+    def stop(self):
+        self._sampling = False
+        self.peak_rss = max(self.peak_rss, rss_kb(self.process.pid, 'VmHWM') or 0)
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+# ------ Client ------
+
+async def http(port, method, path, body=b'', headers=None, timeout=30.0):
+    """Minimal HTTP/1.1 request on a fresh connection; returns (status, headers)"""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+    try:
+        lines = [f"{method} {path} HTTP/1.1", f"Host: 127.0.0.1:{port}", "Connection: close",
+                 f"Content-Length: {len(body)}"]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        response = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    head = response.split(b'\r\n\r\n', 1)[0].decode('latin-1').split('\r\n')
+    fields = dict(line.split(': ', 1) for line in head[1:] if ': ' in line)
+    return int(head[0].split()[1]), {name.lower(): value for name, value in fields.items()}
+
+async def client(port, ips, deadline, results):
+    """Loop over the public flow until the deadline, recording (kind, status, seconds)"""
+    async def timed(kind, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            status, headers = await http(port, *args, **kwargs)
+        except (OSError, asyncio.TimeoutError) as e:
+            status, headers = type(e).__name__, {}
+        results.append((kind, status, time.perf_counter() - started))
+        return status, headers
+
+    while time.monotonic() < deadline:
+        ip = next(ips)
+        status, headers = await timed('transform', 'POST', '/', b'input_string=hello', {
+            'Content-Type': 'application/x-www-form-urlencoded', 'X-Forwarded-For': ip})
+        if status == 302:
+            await timed('view', 'GET', urllib.parse.urlsplit(headers['location']).path,
+                        headers={'X-Forwarded-For': ip})
+        await timed('bootstrap', 'GET', '/mobile/api/bootstrap', headers={'X-Forwarded-For': ip})
+
+async def load(port, concurrency, duration):
+    # Every transform comes from a new IP, so each one creates an entry
+    ips = (f'10.{n // 65536 % 256}.{n // 256 % 256}.{n % 256}' for n in itertools.count(1))
+    results = []
+    started = time.monotonic()
+    await asyncio.gather(*(client(port, ips, started + duration, results) for _ in range(concurrency)))
+    return results, time.monotonic() - started
+
+# ------ Report ------
+
+def summarize(mode, concurrency, server, results, wall_time, memory_mb):
+    latencies = sorted(result[2] * 1000 for result in results)
+    statuses = Counter(str(result[1]) for result in results)
+    errors = sum(n for status, n in statuses.items() if not status.isdigit() or int(status) >= 500)
+    peak_mb = round(server.peak_rss / 1024, 1) if server.peak_rss else None
+    return {
+        'mode': mode,
+        'concurrency': concurrency,
+        'requests': len(results),
+        'rate_per_s': round(len(results) / wall_time, 1) if wall_time else None,
+        'errors': errors,
+        'statuses': dict(sorted(statuses.items())),
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'idle_rss_mb': round(server.idle_rss / 1024, 1) if server.idle_rss else None,
+        'peak_rss_mb': peak_mb,
+        'within_budget': peak_mb is None or memory_mb is None or peak_mb <= memory_mb,
+    }
+
+def print_report(rows, memory_mb):
+    print(f"{'mode':5} {'clients':>7} {'req/s':>8} {'errors':>6} {'p50 ms':>8} {'p99 ms':>9} "
+          f"{'idle MB':>8} {'peak MB':>8}")
+    for row in rows:
+        flag = '' if row['within_budget'] else '  over budget'
+        print(f"{row['mode']:5} {row['concurrency']:>7} {row['rate_per_s'] or 0:>8.1f} {row['errors']:>6} "
+              f"{row['p50_ms']:>8.2f} {row['p99_ms']:>9.2f} {row['idle_rss_mb'] or 0:>8.1f} "
+              f"{row['peak_rss_mb'] or 0:>8.1f}{flag}")
+    if memory_mb:
+        print(f"\nHighest concurrency within {memory_mb:g} MB:")
+        for mode in sorted({row['mode'] for row in rows}):
+            fitting = [row for row in rows if row['mode'] == mode and row['within_budget'] and not row['errors']]
+            best = max(fitting, key=lambda row: row['concurrency'], default=None)
+            print(f"  {mode}: " + (f"{best['concurrency']} clients at {best['rate_per_s']:.1f} req/s"
+                                   if best else "none"))
+
+# ------ CLI ------
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--levels', default='8,32,128,512', help='comma-separated client counts')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per level')
+    parser.add_argument('--modes', default=','.join(MODES))
+    parser.add_argument('--memory-mb', type=float, default=None, help='RSS budget per server process')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    rows = []
+    # db_dir also takes the servers' logs, keeping them out of logs/logs.txt
+    with tempfile.TemporaryDirectory() as db_dir:
+        for mode in args.modes.split(','):
+            for concurrency in (int(level) for level in args.levels.split(',')):
+                server = Server(mode, concurrency, db_dir)
+                try:
+                    server.wait_ready()
+                    results, wall_time = asyncio.run(load(server.port, concurrency, args.duration))
+                finally:
+                    server.stop()
+                rows.append(summarize(mode, concurrency, server, results, wall_time, args.memory_mb))
+                if not args.json:
+                    print(f"{mode} x{concurrency}: {rows[-1]['rate_per_s']} req/s, "
+                          f"peak {rows[-1]['peak_rss_mb']} MB", file=sys.stderr)
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_report(rows, args.memory_mb)
+
+if __name__ == '__main__':
+    main()
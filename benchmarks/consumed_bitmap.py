@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark: database reads removed by the consumed-id bitmap.
+
+Seeds a throwaway SQLite database, then replays a /view/<id> workload in
+which a share of requests are repeat views of already used links. The
+workload runs once with the bitmap disabled and once enabled, reporting
+SQL statements and latency per request for each.
+
+    python benchmarks/consumed_bitmap.py --entries 20000 --requests 5000 --repeat-share 0.8
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Keep benchmark records out of logs/logs.txt, which replay.py reads as traffic
+os.environ.setdefault('LOG_DIR', tempfile.mkdtemp(prefix='bench-logs-'))
+
+from sqlalchemy import event
+from app import create_app, worker_init
+from models import db, StringEntry
+
+def seed(app, entries):
+    now = datetime.utcnow()
+    with app.app_context():
+        db.session.execute(StringEntry.__table__.insert(), [
+            {
+                'input_string': f'pattern {i}',
+                'transformed_string': f'RESULT {i}',
+                'ip_address': f'10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}',
+                'accessed': False,
+                'reaccesible': False,
+                'created_at': now,
+                'updated_at': now,
+            }
+            for i in range(entries)
+        ])
+        db.session.commit()
+
+def build_workload(entries, requests, repeat_share, rng):
+    """Fresh claims walk unused ids in order; repeats revisit claimed ones"""
+    workload, claimed = [], []
+    next_fresh = 1
+    for _ in range(requests):
+        if claimed and (rng.random() < repeat_share or next_fresh > entries):
+            workload.append(rng.choice(claimed))
+        else:
+            workload.append(next_fresh)
+            claimed.append(next_fresh)
+            next_fresh += 1
+    return workload
+
+def run(args, use_bitmap):
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'SECRET_KEY': 'bench',
+        'CONSUMED_BITMAP': use_bitmap,
+    })
+    seed(app, args.entries)
+    worker_init(app)
+
+    statements = [0]
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda *a: statements.__setitem__(0, statements[0] + 1))
+
+    workload = build_workload(args.entries, args.requests, args.repeat_share, random.Random(args.seed))
+    client = app.test_client()
+    latencies = []
+    for entry_id in workload:
+        started = time.perf_counter()
+        client.get(f'/view/{entry_id}')
+        latencies.append(time.perf_counter() - started)
+
+    latencies.sort()
+    return {
+        'statements': statements[0],
+        'per_request': statements[0] / len(workload),
+        'mean_ms': sum(latencies) / len(latencies) * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--entries', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--repeat-share', type=float, default=0.8,
+                        help='fraction of views that revisit an already used link')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    baseline = run(args, use_bitmap=False)
+    bitmap = run(args, use_bitmap=True)
+
+    print(f"{args.requests} views, {args.repeat_share:.0%} repeats of used links")
+    print(f"{'':10} {'SQL stmts':>10} {'per req':>8} {'mean ms':>8} {'p99 ms':>8}")
+    for name, result in (('no bitmap', baseline), ('bitmap', bitmap)):
+        print(f"{name:10} {result['statements']:>10} {result['per_request']:>8.2f} "
+              f"{result['mean_ms']:>8.3f} {result['p99_ms']:>8.3f}")
+    removed = 1 - bitmap['statements'] / baseline['statements']
+    print(f"Database statements removed: {removed:.1%}")
+
+if __name__ == '__main__':
+    main()
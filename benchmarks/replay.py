@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Replay production traffic recorded in the application log.
+
+Parses logs/logs.txt and its rotated backups (.5 oldest ... .1) into a
+trace of transformation requests, view requests and admin logins, then
+replays the trace against a running instance with the original relative
+timing, or N times faster, and reports the latency distribution.
+
+    python benchmarks/replay.py parse logs/logs.txt -o trace.jsonl
+    python benchmarks/replay.py run trace.jsonl --target http://127.0.0.1:8000 --speed 10
+
+Views are linked to the transformation request that created their entry,
+so a replayed view opens the entry the replayed request just created on
+the target. Client IPs are sent in X-Forwarded-For; start the target with
+BEHIND_PROXY=True so per-IP behaviour matches production. Log passwords
+are never recorded, so recorded successful logins use --admin-password and
+failed ones send a wrong password.
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import re
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+BACKUP_COUNT = 5  # matches the RotatingFileHandler in config.setup_logger
+PENDING_TIMEOUT = 60.0  # seconds a request waits for its outcome line before it is dropped
+
+LINE = re.compile(
+    r'^(?P<ts>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) - [^ ]+ - (?P<level>[A-Z]+) - (?P<message>.*)$'
+)
+TRANSFORM = re.compile(r'^Transformation request from IP: (?P<ip>\S+) for string: (?P<input>.*)$')
+# Older logs carry no IP on outcome and error lines; those fall back to arrival order
+CREATED = re.compile(
+    r'^(?:Created new string entry|Reset existing entry|Reused entry) #(?P<entry>\d+)(?:.* IP: (?P<ip>\S+))?'
+)
+FAILED = re.compile(r'^Error in index route(?: for IP (?P<ip>\S+))?: ')
+NO_MATCH = re.compile(r'^No matching pattern found for: (?P<input>.*)$')
+ALREADY = re.compile(r"^IP (?P<ip>\S+) already accessed pattern '(?P<input>.*)'$")
+DUPLICATE = re.compile(r"^Duplicate submission from IP: (?P<ip>\S+) for string: (?P<input>.*) answered with '\w+'$")
+VIEW = re.compile(r'^View request for entry #(?P<entry>\d+)')
+LOGIN = re.compile(r'^Login attempt for user: (?P<username>.*) from IP: (?P<ip>\S+)$')
+LOGIN_RESULT = re.compile(r'^(?P<result>Successful|Failed) login(?: attempt)? for user: (?P<username>.*)$')
+
+# ------ Parsing ------
+
+def log_files(path):
+    """The log and its rotated backups, oldest first, skipping missing ones"""
+    candidates = [f"{path}.{n}" for n in range(BACKUP_COUNT, 0, -1)] + [path]
+    return [candidate for candidate in candidates if os.path.exists(candidate)]
+
+def read_lines(paths):
+    """Yield (timestamp, message) for every log record; traceback lines are skipped"""
+    for path in paths:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            for line in f:
+                match = LINE.match(line.rstrip('\n'))
+                if match:
+                    ts = datetime.strptime(match['ts'], '%Y-%m-%d %H:%M:%S,%f')
+                    yield ts, match['message']
+
+def take_pending(pending, ip=None, input_string=None):
+    """Remove and return the oldest pending transform from ip for input_string; None matches any"""
+    for event in pending:
+        if (ip is None or event['ip'] == ip) and (input_string is None or event['input'] == input_string):
+            pending.remove(event)
+            return event
+    return None
+
+def parse_trace(paths):
+    """
+    Build the trace from log records. Each transformation request is
+    matched to the outcome logged after it (new/reset/reused entry, no
+    match, already accessed, a duplicate's shared answer or an error) by
+    client IP and input. Requests whose outcome never shows up are dropped
+    after PENDING_TIMEOUT, so they can't be paired with a later outcome.
+    """
+    events = []
+    pending_transforms = deque()
+    pending_logins = deque()
+    for ts, message in sorted(read_lines(paths), key=lambda record: record[0]):
+        while pending_transforms and (ts - pending_transforms[0]['ts']).total_seconds() > PENDING_TIMEOUT:
+            pending_transforms.popleft()
+
+        match = TRANSFORM.match(message)
+        if match:
+            event = {'ts': ts, 'kind': 'transform', 'ip': match['ip'],
+                     'input': match['input'], 'entry': None}
+            events.append(event)
+            pending_transforms.append(event)
+            continue
+
+        match = CREATED.match(message)
+        if match:
+            event = take_pending(pending_transforms, ip=match['ip'])
+            if event is not None:
+                event['entry'] = int(match['entry'])
+            continue
+
+        match = FAILED.match(message)
+        if match:
+            take_pending(pending_transforms, ip=match['ip'])
+            continue
+
+        match = NO_MATCH.match(message) or ALREADY.match(message) or DUPLICATE.match(message)
+        if match:
+            take_pending(pending_transforms, ip=match.groupdict().get('ip'), input_string=match['input'])
+            continue
+
+        match = VIEW.match(message)
+        if match:
+            events.append({'ts': ts, 'kind': 'view', 'entry': int(match['entry'])})
+            continue
+
+        match = LOGIN.match(message)
+        if match:
+            event = {'ts': ts, 'kind': 'login', 'ip': match['ip'],
+                     'username': match['username'], 'success': False}
+            events.append(event)
+            pending_logins.append(event)
+            continue
+
+        match = LOGIN_RESULT.match(message)
+        if match:
+            for event in pending_logins:
+                if event['username'] == match['username']:
+                    event['success'] = match['result'] == 'Successful'
+                    pending_logins.remove(event)
+                    break
+
+    if not events:
+        return []
+
+    start = events[0]['ts']
+    for event in events:
+        event['t'] = round((event.pop('ts') - start).total_seconds(), 3)
+    return events
+
+def save_trace(events, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        for event in events:
+            f.write(json.dumps(event) + '\n')
+
+def load_trace(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+# ------ Replay ------
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Keep 3xx responses so the new entry id can be read from Location"""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+class Replayer:
+    def __init__(self, target, speed=1.0, concurrency=32, timeout=10.0,
+                 admin_password=None, link_wait=5.0):
+        self.target = target.rstrip('/')
+        self.speed = speed
+        self.timeout = timeout
+        self.admin_password = admin_password
+        self.link_wait = link_wait
+        self.pool = ThreadPoolExecutor(max_workers=concurrency)
+        self._lock = threading.Lock()
+        self._entry_ids = {}                          # recorded entry id -> id on the target
+        self._created = {}                            # recorded id -> Event set once mapped
+        self.results = []                             # (kind, status, latency, lag)
+
+    def _open(self, path, ip=None, data=None, opener=None):
+        headers = {'X-Forwarded-For': ip} if ip else {}
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        request = urllib.request.Request(self.target + path, data=body, headers=headers)
+        opener = opener or urllib.request.build_opener(NoRedirect)
+        try:
+            with opener.open(request, timeout=self.timeout) as response:
+                response.read()
+                return response.status, response.headers
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code, e.headers
+
+    def _transform(self, event):
+        status, headers = self._open('/', event['ip'], {'input_string': event['input']})
+        location = headers.get('Location', '') if headers else ''
+        match = re.search(r'/view/(\d+)', location)
+        if event.get('entry') is not None:
+            if match:
+                with self._lock:
+                    self._entry_ids[event['entry']] = int(match.group(1))
+            self._created[event['entry']].set()
+        return status
+
+    def _view(self, event):
+        with self._lock:
+            entry_id = self._entry_ids.get(event['entry'], event['entry'])
+        return self._open(f'/view/{entry_id}')[0]
+
+    def _login(self, event):
+        password = self.admin_password if event['success'] and self.admin_password else 'not-the-password'
+        opener = urllib.request.build_opener(NoRedirect, urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        return self._open('/admin/login', event['ip'],
+                          {'username': event['username'], 'password': password}, opener)[0]
+
+    def _execute(self, event, scheduled):
+        # A view's creating request may still be in flight at high speed-ups;
+        # the wait counts as dispatch lag, not latency
+        if event['kind'] == 'view' and event['entry'] in self._created:
+            self._created[event['entry']].wait(self.link_wait)
+        started = time.monotonic()
+        lag = started - scheduled
+        try:
+            status = getattr(self, f"_{event['kind']}")(event)
+        except (urllib.error.URLError, OSError) as e:
+            status = type(e).__name__
+        latency = time.monotonic() - started
+        with self._lock:
+            self.results.append((event['kind'], status, latency, lag))
+
+    def run(self, events):
+        """Dispatch events on their (scaled) original schedule; returns wall time"""
+        for event in events:
+            if event['kind'] == 'transform' and event.get('entry') is not None:
+                self._created[event['entry']] = threading.Event()
+
+        start = time.monotonic()
+        for event in events:
+            scheduled = start + (event['t'] / self.speed if self.speed else 0)
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.pool.submit(self._execute, event, scheduled)
+        self.pool.shutdown(wait=True)
+        return time.monotonic() - start
+
+# ------ Report ------
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def summarize(results, wall_time):
+    groups = defaultdict(list)
+    for result in results:
+        groups[result[0]].append(result)
+        groups['all'].append(result)
+
+    report = {'wall_time_s': round(wall_time, 3), 'kinds': {}}
+    for kind, rows in groups.items():
+        latencies = sorted(row[2] * 1000 for row in rows)
+        lags = sorted(row[3] * 1000 for row in rows)
+        statuses = Counter(str(row[1]) for row in rows)
+        report['kinds'][kind] = {
+            'requests': len(rows),
+            'rate_per_s': round(len(rows) / wall_time, 2) if wall_time else None,
+            'statuses': dict(sorted(statuses.items())),
+            'errors': sum(n for status, n in statuses.items() if not status.isdigit() or int(status) >= 500),
+            'mean_ms': round(sum(latencies) / len(latencies), 2),
+            'p50_ms': round(percentile(latencies, 0.50), 2),
+            'p90_ms': round(percentile(latencies, 0.90), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+            'max_ms': round(latencies[-1], 2),
+            'p99_dispatch_lag_ms': round(percentile(lags, 0.99), 2),
+        }
+    return report
+
+def print_report(report):
+    print(f"Replayed in {report['wall_time_s']:.1f}s")
+    print(f"{'kind':10} {'reqs':>6} {'req/s':>7} {'errors':>6} {'mean ms':>8} {'p50':>8} "
+          f"{'p90':>8} {'p99':>8} {'max':>8} {'lag p99':>8}")
+    for kind, row in sorted(report['kinds'].items(), key=lambda item: item[0] == 'all'):
+        print(f"{kind:10} {row['requests']:>6} {row['rate_per_s'] or 0:>7.1f} {row['errors']:>6} "
+              f"{row['mean_ms']:>8.2f} {row['p50_ms']:>8.2f} {row['p90_ms']:>8.2f} "
+              f"{row['p99_ms']:>8.2f} {row['max_ms']:>8.2f} {row['p99_dispatch_lag_ms']:>8.2f}")
+    for kind, row in sorted(report['kinds'].items()):
+        if kind != 'all':
+            print(f"  {kind} statuses: {row['statuses']}")
+
+# ------ CLI ------
+
+def describe(events):
+    kinds = Counter(event['kind'] for event in events)
+    duration = events[-1]['t'] if events else 0
+    linked = sum(1 for event in events if event['kind'] == 'transform' and event.get('entry') is not None)
+    return (f"{len(events)} events over {duration:.1f}s: " +
+            ', '.join(f"{n} {kind}" for kind, n in sorted(kinds.items())) +
+            f" ({linked} transforms linked to an entry)")
+
+def load_source(source):
+    """A saved trace (.jsonl) or a log file, which is parsed with its backups"""
+    if source.endswith('.jsonl'):
+        return load_trace(source)
+    return parse_trace(log_files(source))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    parse_cmd = commands.add_parser('parse', help='build a trace from the log and its backups')
+    parse_cmd.add_argument('log', nargs='?', default='logs/logs.txt')
+    parse_cmd.add_argument('-o', '--output', default='trace.jsonl')
+
+    run_cmd = commands.add_parser('run', help='replay a trace (or a log file) against a server')
+    run_cmd.add_argument('source', help='trace .jsonl file or log file')
+    run_cmd.add_argument('--target', default='http://127.0.0.1:8000')
+    run_cmd.add_argument('--speed', type=float, default=1.0,
+                         help='time compression factor (0 = send as fast as possible)')
+    run_cmd.add_argument('--concurrency', type=int, default=32, help='max requests in flight')
+    run_cmd.add_argument('--timeout', type=float, default=10.0)
+    run_cmd.add_argument('--limit', type=int, default=None, help='replay only the first N events')
+    run_cmd.add_argument('--kinds', default='transform,view,login',
+                         help='comma-separated event kinds to replay')
+    run_cmd.add_argument('--admin-password', default=None,
+                         help='password for recorded successful logins')
+    run_cmd.add_argument('--json', action='store_true', help='print the report as JSON')
+
+    args = parser.parse_args()
+
+    if args.command == 'parse':
+        files = log_files(args.log)
+        if not files:
+            parser.error(f"no log files found at {args.log}")
+        events = parse_trace(files)
+        save_trace(events, args.output)
+        print(f"Read {len(files)} file(s); wrote {args.output}: {describe(events)}")
+        return
+
+    kinds = set(args.kinds.split(','))
+    events = [event for event in load_source(args.source) if event['kind'] in kinds][:args.limit]
+    if not events:
+        sys.exit("Nothing to replay")
+
+    if not args.json:
+        print(f"Replaying {describe(events)} against {args.target} at "
+              f"{'max speed' if not args.speed else f'{args.speed:g}x'}")
+    replayer = Replayer(args.target, speed=args.speed, concurrency=args.concurrency,
+                        timeout=args.timeout, admin_password=args.admin_password)
+    report = summarize(replayer.results, replayer.run(events))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+if __name__ == '__main__':
+    main()
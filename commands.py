@@ -0,0 +1,123 @@
+"""
+Non-interactive maintenance commands.
+
+Registered on the app as the `maint` group:
+
+    flask --app app maint integrity-check --quick
+    python maintenance.py analyze
+
+Every command prints a JSON object and exits 0 on success, 1 when the
+operation ran but reported a problem, and 2 when it could not run.
+"""
+
+import io
+import json
+import sys
+from contextlib import redirect_stdout
+import click
+from flask import current_app
+from flask.cli import AppGroup
+import db_health
+import rollups
+import utils
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_ERROR = 2
+
+maintenance_cli = AppGroup('maint', help="Database maintenance and health commands.")
+
+def emit(result, code=None):
+    """Print result as JSON and exit with the matching status code"""
+    click.echo(json.dumps(result, indent=2, default=str))
+    if code is None:
+        code = EXIT_OK if result.get('ok') else EXIT_FAILED
+    sys.exit(code)
+
+def run(operation, *args, **kwargs):
+    try:
+        result = operation(*args, **kwargs)
+    except Exception as e:
+        emit({'ok': False, 'message': f"{type(e).__name__}: {e}"}, EXIT_ERROR)
+    emit(result)
+
+def run_legacy(function):
+    """Run a menu-era fix function, folding its printed progress into the JSON output"""
+    output = io.StringIO()
+    with redirect_stdout(output):
+        ok = function(current_app)
+    return {'ok': ok, 'output': output.getvalue().splitlines()}
+
+@maintenance_cli.command('vacuum')
+@click.option('--pages', type=int, default=None, help="Max free pages to release (default: all).")
+@click.option('--chunk', type=int, default=256, show_default=True, help="Pages released per step.")
+@click.option('--enable', is_flag=True, help="Switch to incremental auto-vacuum (one blocking VACUUM).")
+def vacuum_command(pages, chunk, enable):
+    """Incrementally release free pages back to the filesystem."""
+    run(db_health.incremental_vacuum, pages=pages, chunk=chunk, enable=enable)
+
+@maintenance_cli.command('analyze')
+@click.option('--limit', type=int, default=1000, show_default=True, help="Rows sampled per index.")
+def analyze_command(limit):
+    """Refresh query planner statistics."""
+    run(db_health.analyze, limit=limit)
+
+@maintenance_cli.command('integrity-check')
+@click.option('--quick', is_flag=True, help="Use quick_check (skips index/content consistency).")
+@click.option('--max-errors', type=int, default=100, show_default=True)
+def integrity_check_command(quick, max_errors):
+    """Verify database integrity; exits 1 if problems are found."""
+    run(db_health.integrity_check, quick=quick, max_errors=max_errors)
+
+@maintenance_cli.command('checkpoint')
+@click.option('--mode', type=click.Choice(db_health.CHECKPOINT_MODES, case_sensitive=False),
+              default='PASSIVE', show_default=True)
+def checkpoint_command(mode):
+    """Checkpoint the write-ahead log; exits 1 if it could not complete."""
+    run(db_health.wal_checkpoint, mode=mode)
+
+@maintenance_cli.command('sizes')
+@click.option('--rows', is_flag=True, help="Also count rows per table (scans every table).")
+def sizes_command(rows):
+    """Report table and index sizes."""
+    run(db_health.table_sizes, row_counts=rows)
+
+@maintenance_cli.command('backfill-keys')
+def backfill_keys_command():
+    """Compute missing canonical pattern keys on string pairs and entries."""
+    run(utils.backfill_keys)
+
+@maintenance_cli.command('refresh-rollups')
+def refresh_rollups_command():
+    """Roll up the days touched since the last refresh."""
+    run(lambda: {'ok': True, 'days': [day.isoformat() for day in rollups.refresh_rollups()]})
+
+@maintenance_cli.command('rebuild-rollups')
+@click.option('--from', 'start', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help="First day to rebuild (default: earliest data).")
+@click.option('--to', 'end', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help="Last day to rebuild (default: latest data).")
+def rebuild_rollups_command(start, end):
+    """Recompute dashboard rollups for a date range from the raw rows."""
+    run(rollups.rebuild_rollups, start=start.date() if start else None, end=end.date() if end else None)
+
+@maintenance_cli.command('fix-database')
+def fix_database_command():
+    """Create missing tables, restore the admin user and fix orphaned patterns."""
+    run(run_legacy, utils.fix_database)
+
+@maintenance_cli.command('check-templates')
+def check_templates_command():
+    """Check that critical templates are present."""
+    run(run_legacy, utils.fix_critical_templates)
+
+@maintenance_cli.command('reset-database')
+@click.option('--yes', is_flag=True, help="Confirm deleting all data.")
+def reset_database_command(yes):
+    """Drop and recreate all tables (deletes ALL data)."""
+    if not yes:
+        emit({'ok': False, 'message': "Refusing to reset without --yes"}, EXIT_ERROR)
+    run(run_legacy, utils.reset_database)
+
+def register_commands(app):
+    app.cli.add_command(maintenance_cli)
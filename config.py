@@ -8,7 +8,8 @@ load_dotenv()  # Load environment variables from .env file
 
 # Configure logging
 def setup_logger():
-    log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
+    # LOG_DIR lets benchmarks and tests keep their records out of the app log
+    log_dir = os.getenv('LOG_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
     if not os.path.exists(log_dir):
         os.makedirs(log_dir)
 
@@ -17,6 +18,10 @@ def setup_logger():
     # Create a logger
     logger = logging.getLogger('string_transformer')
     logger.setLevel(logging.INFO)
+    
+    # Already configured (e.g. create_app called again in the same process)
+    if logger.handlers:
+        return logger
 
     # Create a file handler that logs even debug messages
     file_handler = RotatingFileHandler(log_file, maxBytes=10485760, backupCount=5)
@@ -44,3 +49,59 @@ class Config:
     # Add proxy configuration
     BEHIND_PROXY = os.getenv('BEHIND_PROXY', 'False').lower() == 'true'
     PROXY_HEADERS = ['X-Forwarded-For', 'X-Real-IP']
+    
+    # Read/write routing: send read-only queries to READ_DATABASE_URI, or with
+    # READ_REPLICA on SQLite, to a read-only pool on the same file (WAL mode)
+    READ_DATABASE_URI = os.getenv('READ_DATABASE_URI')
+    READ_REPLICA = os.getenv('READ_REPLICA', 'False').lower() == 'true'
+    SQLITE_WAL = os.getenv('SQLITE_WAL', 'False').lower() == 'true'
+    
+    # Spread string entries over N database files by IP hash (1 = no sharding).
+    # ENTRY_SHARD_URI may give the shard URIs with a {shard} placeholder.
+    ENTRY_SHARDS = int(os.getenv('ENTRY_SHARDS', 1))
+    ENTRY_SHARD_URI = os.getenv('ENTRY_SHARD_URI')
+    
+    # Startup: run the one-time schema setup in this process, and warm up
+    # templates, pattern lookup and connections before serving traffic
+    INIT_DB = os.getenv('INIT_DB', 'True').lower() == 'true'
+    WARM_UP = os.getenv('WARM_UP', 'False').lower() == 'true'
+    
+    # Health probes: /readyz deadline for each database check, and the
+    # server's worker threads per process (Waitress --threads), used to
+    # report thread utilization and checked against the load-shedding limits
+    READY_TIMEOUT = float(os.getenv('READY_TIMEOUT', 1.0))
+    SERVER_THREADS = int(os.getenv('SERVER_THREADS', 16))
+    
+    # ASGI mode (asgi.py): max in-flight requests on the async public routes
+    # and database connections they share, per process
+    ASGI_CONCURRENCY = int(os.getenv('ASGI_CONCURRENCY', 256))
+    ASGI_DB_POOL_SIZE = int(os.getenv('ASGI_DB_POOL_SIZE', 8))
+    
+    # Seconds between dashboard rollup refreshes in each worker (0 = only
+    # via `maint refresh-rollups`, e.g. from cron)
+    ROLLUP_INTERVAL = int(os.getenv('ROLLUP_INTERVAL', 60))
+    
+    # Answer repeat views of used one-time links from memory. Single process
+    # only: re-enabling an entry clears it in the process that handled the
+    # toggle, and other processes would keep rejecting the link
+    CONSUMED_BITMAP = os.getenv('CONSUMED_BITMAP', 'False').lower() == 'true'
+    
+    # Duplicate submissions (same IP and input) share one execution; the
+    # redirect is replayed for this many seconds (0 disables), per process
+    IDEMPOTENCY_TTL = float(os.getenv('IDEMPOTENCY_TTL', 10))
+    IDEMPOTENCY_MAX_ENTRIES = int(os.getenv('IDEMPOTENCY_MAX_ENTRIES', 10000))
+    
+    # Load shedding: max in-flight requests per route class (per process).
+    # The limits must sum to no more than SERVER_THREADS, or requests queue
+    # inside the server before the limiter can shed them; the defaults use
+    # 15 of the 16 default threads, leaving one for the health probes
+    LOAD_SHEDDING = os.getenv('LOAD_SHEDDING', 'True').lower() == 'true'
+    CONCURRENCY_LIMITS = {
+        'public': int(os.getenv('LIMIT_PUBLIC', 5)),
+        'view': int(os.getenv('LIMIT_VIEW', 4)),
+        'admin': int(os.getenv('LIMIT_ADMIN', 2)),
+        'static': int(os.getenv('LIMIT_STATIC', 2)),
+        'stream': int(os.getenv('LIMIT_STREAM', 2)),  # each open dashboard feed holds a thread
+    }
+    QUEUE_TIMEOUT = float(os.getenv('QUEUE_TIMEOUT', 0.5))  # seconds to wait for a slot
+    RETRY_AFTER = int(os.getenv('RETRY_AFTER', 2))  # seconds, sent with 503 responses
@@ -0,0 +1,94 @@
+"""
+In-process bitmap of consumed one-time entries.
+
+Entry ids are sequential integers, so one bit per id is enough to answer
+"has this link already been used?" without touching the database. The set
+is exact: it is loaded from the database at startup and kept current by
+every code path that claims, re-enables or creates an entry in this
+process. It assumes a single serving process (Waitress); with several
+processes, disable it with CONSUMED_BITMAP=False.
+"""
+
+import threading
+from models import StringEntry
+from sharding import entry_shards
+
+LOAD_BATCH_SIZE = 10000
+
+class ConsumedBitmap:
+    def __init__(self):
+        self._bits = bytearray()
+        self._lock = threading.Lock()
+        self.enabled = False
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, entry_id):
+        if not self.enabled:
+            return False
+        byte = entry_id >> 3
+        found = 0 <= byte < len(self._bits) and bool(self._bits[byte] & (1 << (entry_id & 7)))
+        # Unlocked counters; approximate under concurrency, which is fine for stats
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return found
+
+    def add(self, entry_id):
+        if not self.enabled:
+            return
+        byte = entry_id >> 3
+        with self._lock:
+            if byte >= len(self._bits):
+                # Grow geometrically so sequential ids don't reallocate on every claim
+                self._bits.extend(bytes(max(byte + 1 - len(self._bits), len(self._bits) // 2)))
+            self._bits[byte] |= 1 << (entry_id & 7)
+
+    def discard(self, entry_id):
+        if not self.enabled:
+            return
+        byte = entry_id >> 3
+        with self._lock:
+            if byte < len(self._bits):
+                self._bits[byte] &= ~(1 << (entry_id & 7)) & 0xFF
+
+    def discard_many(self, entry_ids):
+        for entry_id in entry_ids:
+            self.discard(entry_id)
+
+    def load(self):
+        """(Re)build the bitmap from the database; needs an app context"""
+        bits = bytearray()
+        count = 0
+        for shard in range(entry_shards.count):
+            consumed = entry_shards.session(shard).query(StringEntry.id) \
+                .filter_by(accessed=True, reaccesible=False) \
+                .execution_options(yield_per=LOAD_BATCH_SIZE)
+
+            for (entry_id,) in consumed:
+                byte = entry_id >> 3
+                if byte >= len(bits):
+                    bits.extend(bytes(max(byte + 1 - len(bits), len(bits) // 2)))
+                bits[byte] |= 1 << (entry_id & 7)
+                count += 1
+
+        with self._lock:
+            self._bits = bits
+            self.enabled = True
+        return count
+
+    def disable(self):
+        with self._lock:
+            self._bits = bytearray()
+            self.enabled = False
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'bytes': len(self._bits),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+consumed_entries = ConsumedBitmap()
@@ -0,0 +1,166 @@
+"""
+Online database health operations for SQLite.
+
+Each operation runs on its own autocommit connection with a busy timeout,
+works in small steps where SQLite allows it, and returns a JSON-friendly
+dict with an "ok" flag. They are safe to run against the live database;
+none of them holds the write lock for long except the one-off
+switch to incremental auto-vacuum, which is opt-in.
+
+With ENTRY_SHARDS > 1 every operation runs on the main database and then
+on each entry shard file, and reports one result per file.
+"""
+
+import functools
+import time
+from models import db
+from sharding import SHARD_BIND, entry_shards
+
+BUSY_TIMEOUT_MS = 5000
+CHECKPOINT_MODES = ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE')
+AUTO_VACUUM_MODES = {0: 'none', 1: 'full', 2: 'incremental'}
+
+class UnsupportedDatabase(Exception):
+    """Raised when the configured database is not SQLite"""
+
+def _connect(engine):
+    if engine.dialect.name != 'sqlite':
+        raise UnsupportedDatabase(f"Operation requires SQLite, not {engine.dialect.name}")
+    conn = engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+    conn.exec_driver_sql(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+    return conn
+
+def databases():
+    """(name, engine) for the main database and each entry shard file"""
+    found = [('main', db.engine)]
+    if entry_shards.enabled:
+        found += [(SHARD_BIND.format(shard), engine) for shard, engine in enumerate(entry_shards.engines())]
+    return found
+
+def per_database(operation):
+    """
+    Run operation(engine, ...) on every database file in turn. A single
+    database gives its result directly; shards give {'ok', 'databases'}
+    with one result per file, ok only if every file is.
+    """
+    @functools.wraps(operation)
+    def run_all(*args, **kwargs):
+        results = {name: {'file': engine.url.database, **operation(engine, *args, **kwargs)}
+                   for name, engine in databases()}
+        if len(results) == 1:
+            return next(iter(results.values()))
+        return {'ok': all(result['ok'] for result in results.values()), 'databases': results}
+    return run_all
+
+def _pragma(conn, name):
+    return conn.exec_driver_sql(f'PRAGMA {name}').scalar()
+
+@per_database
+def incremental_vacuum(engine, pages=None, chunk=256, pause=0.05, enable=False):
+    """
+    Return free pages to the filesystem a chunk at a time, pausing between
+    chunks so writers can get in. Requires auto_vacuum=INCREMENTAL; with
+    enable=True the mode is switched on, which needs one full (blocking) VACUUM.
+    """
+    with _connect(engine) as conn:
+        mode = AUTO_VACUUM_MODES.get(_pragma(conn, 'auto_vacuum'), 'unknown')
+        if mode != 'incremental':
+            if not enable:
+                return {'ok': False, 'auto_vacuum': mode,
+                        'message': "auto_vacuum is not INCREMENTAL; rerun with --enable "
+                                   "(performs one full, blocking VACUUM)"}
+            conn.exec_driver_sql('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.exec_driver_sql('VACUUM')
+            return {'ok': True, 'auto_vacuum': 'incremental',
+                    'message': "Enabled incremental auto-vacuum with a full VACUUM",
+                    'free_pages': _pragma(conn, 'freelist_count')}
+
+        free_before = _pragma(conn, 'freelist_count')
+        remaining = free_before if pages is None else min(pages, free_before)
+        started = time.perf_counter()
+        while remaining > 0:
+            step = min(chunk, remaining)
+            # The pragma only makes progress while its rows are being stepped
+            conn.exec_driver_sql(f'PRAGMA incremental_vacuum({step})').fetchall()
+            remaining -= step
+            if remaining:
+                time.sleep(pause)
+
+        free_after = _pragma(conn, 'freelist_count')
+        return {'ok': True, 'auto_vacuum': mode,
+                'free_pages_before': free_before, 'free_pages_after': free_after,
+                'pages_released': free_before - free_after,
+                'seconds': round(time.perf_counter() - started, 3)}
+
+@per_database
+def analyze(engine, limit=1000):
+    """Refresh query planner statistics, sampling at most limit rows per index"""
+    with _connect(engine) as conn:
+        started = time.perf_counter()
+        conn.exec_driver_sql(f'PRAGMA analysis_limit = {int(limit)}')
+        conn.exec_driver_sql('ANALYZE')
+        return {'ok': True, 'analysis_limit': limit,
+                'seconds': round(time.perf_counter() - started, 3)}
+
+@per_database
+def integrity_check(engine, quick=False, max_errors=100):
+    """Run PRAGMA integrity_check (or the faster quick_check)"""
+    pragma = 'quick_check' if quick else 'integrity_check'
+    with _connect(engine) as conn:
+        started = time.perf_counter()
+        rows = [row[0] for row in conn.exec_driver_sql(f'PRAGMA {pragma}({int(max_errors)})')]
+        ok = rows == ['ok']
+        return {'ok': ok, 'check': pragma, 'errors': [] if ok else rows,
+                'seconds': round(time.perf_counter() - started, 3)}
+
+@per_database
+def wal_checkpoint(engine, mode='PASSIVE'):
+    """
+    Checkpoint the write-ahead log. PASSIVE never waits for readers or
+    writers; the stronger modes may wait up to the busy timeout.
+    """
+    mode = mode.upper()
+    if mode not in CHECKPOINT_MODES:
+        return {'ok': False, 'message': f"Unknown checkpoint mode: {mode}"}
+
+    with _connect(engine) as conn:
+        journal_mode = _pragma(conn, 'journal_mode')
+        if journal_mode != 'wal':
+            return {'ok': True, 'journal_mode': journal_mode,
+                    'message': "Database is not in WAL mode; nothing to checkpoint"}
+
+        busy, log_frames, checkpointed = conn.exec_driver_sql(f'PRAGMA wal_checkpoint({mode})').one()
+        return {'ok': not busy, 'mode': mode, 'busy': bool(busy),
+                'wal_frames': log_frames, 'checkpointed_frames': checkpointed}
+
+@per_database
+def table_sizes(engine, row_counts=False):
+    """Report on-disk size of each table and index (needs the dbstat table for detail)"""
+    with _connect(engine) as conn:
+        page_size = _pragma(conn, 'page_size')
+        page_count = _pragma(conn, 'page_count')
+        result = {'ok': True, 'page_size': page_size,
+                  'total_bytes': page_size * page_count,
+                  'free_pages': _pragma(conn, 'freelist_count')}
+
+        objects = {name: {'type': kind, 'table': table}
+                   for name, kind, table in conn.exec_driver_sql(
+                       "SELECT name, type, tbl_name FROM sqlite_master WHERE type IN ('table', 'index')")}
+
+        try:
+            for name, pages, size in conn.exec_driver_sql(
+                    "SELECT name, COUNT(*), SUM(pgsize) FROM dbstat GROUP BY name"):
+                objects.setdefault(name, {'type': 'internal', 'table': None})
+                objects[name].update({'pages': pages, 'bytes': size})
+        except Exception:
+            result['message'] = "dbstat is not available in this SQLite build; per-object sizes omitted"
+
+        if row_counts:
+            preparer = engine.dialect.identifier_preparer
+            for name, info in objects.items():
+                if info['type'] == 'table' and 'sqlite_' not in name:
+                    info['rows'] = conn.exec_driver_sql(
+                        f'SELECT COUNT(*) FROM {preparer.quote(name)}').scalar()
+
+        result['objects'] = dict(sorted(objects.items(), key=lambda item: -item[1].get('bytes', 0)))
+        return result
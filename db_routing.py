@@ -0,0 +1,89 @@
+"""
+Read/write routing between the primary database and a read bind.
+
+When a read bind is configured, the session sends plain SELECTs to it and
+everything else (flushes, bulk UPDATE/DELETE, raw SQL) to the primary.
+Once a session has written, or a view has pinned it with pin_primary(),
+it reads from the primary too, so a request always sees its own writes.
+Sessions are scoped to the request, so the pin ends with the request.
+
+The read bind is either READ_DATABASE_URI (e.g. a replica) or, with
+READ_REPLICA=True on SQLite, a second pool of read-only connections to
+the same file in WAL mode, where readers never block the writer.
+"""
+
+import sqlalchemy as sa
+from flask_sqlalchemy.session import Session
+
+READ_BIND = 'read'
+PIN_KEY = 'pinned_to_primary'
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        primary = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        read_engine = self._db.engines.get(READ_BIND)
+
+        # Explicit binds, models on other binds and writes stay where they are
+        if read_engine is None or bind is not None or primary is not self._db.engines.get(None):
+            return primary
+        if self._flushing or self.info.get(PIN_KEY):
+            return primary
+
+        if isinstance(clause, sa.sql.Select):
+            return read_engine
+
+        # DML and raw SQL can't be assumed read-only
+        if isinstance(clause, sa.sql.dml.UpdateBase):
+            self.info[PIN_KEY] = True
+        return primary
+
+@sa.event.listens_for(RoutingSession, 'after_flush')
+def _pin_after_flush(session, flush_context):
+    session.info[PIN_KEY] = True
+
+def pin_primary(session):
+    """Send the rest of this session's queries to the primary (read-modify-write paths)"""
+    session.info[PIN_KEY] = True
+
+def sqlite_read_only_uri(uri):
+    """Read-only URI for the same SQLite file, or None for other databases"""
+    url = sa.engine.make_url(uri)
+    if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+        return None
+
+    database = url.database if url.query.get('uri') else f'file:{url.database}'
+    return url.set(database=database).update_query_dict({'mode': 'ro', 'uri': 'true'}) \
+        .render_as_string(hide_password=False)
+
+def configure_read_bind(config):
+    """
+    Add the 'read' bind to SQLALCHEMY_BINDS before db.init_app. Returns the
+    read URI, or None when routing is disabled.
+    """
+    read_uri = config.get('READ_DATABASE_URI')
+    if not read_uri and config.get('READ_REPLICA', False):
+        read_uri = sqlite_read_only_uri(config['SQLALCHEMY_DATABASE_URI'])
+        # Concurrent readers need WAL
+        config['SQLITE_WAL'] = True
+
+    if read_uri:
+        binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+        binds[READ_BIND] = read_uri
+        config['SQLALCHEMY_BINDS'] = binds
+    return read_uri
+
+def install_read_only_guard(engine):
+    """Make SQLite read connections reject writes outright"""
+    if engine.dialect.name == 'sqlite':
+        @sa.event.listens_for(engine, 'connect')
+        def _set_query_only(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute('PRAGMA query_only = 1')
+            cursor.close()
+
+def enable_wal(engine):
+    """Switch a SQLite database to WAL mode (persistent in the file); returns the mode"""
+    if engine.dialect.name != 'sqlite':
+        return None
+    with engine.connect() as conn:
+        return conn.exec_driver_sql('PRAGMA journal_mode = WAL').scalar()
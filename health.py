@@ -0,0 +1,251 @@
+"""
+Liveness/readiness probes and runtime statistics.
+
+/healthz only proves the process answers. /readyz checks, within a
+deadline, that each database can be read (on SQLite this takes a shared
+lock, so a file held locked by another process makes the worker not
+ready), that the schema has every table and column the models expect,
+and that pattern data is present. Readiness results are cached briefly
+so a load balancer probing every worker often costs next to nothing.
+Probes open their own unpooled connections with a connect timeout, so a
+worker whose pool is exhausted still answers /readyz within the deadline.
+"""
+
+import math
+import threading
+import time
+import sqlalchemy as sa
+from models import db, StringEntry
+from sharding import entry_shards
+from consumed_ids import consumed_entries
+from submissions import submissions
+import live_feed
+
+READY_CACHE_TTL = 1.0  # seconds a readiness result is reused
+PROCESS_STARTED = time.monotonic()
+
+class PoolStats:
+    """Checkout counters for one engine's connection pool"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.total_hold = 0.0
+        self.max_hold = 0.0
+        sa.event.listen(engine, 'connect', self._on_connect)
+        sa.event.listen(engine, 'checkout', self._on_checkout)
+        sa.event.listen(engine, 'checkin', self._on_checkin)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        connection_record.info['checked_out_at'] = time.perf_counter()
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        started = connection_record.info.pop('checked_out_at', None)
+        if started is None:
+            return
+        held = time.perf_counter() - started
+        with self._lock:
+            self.checked_out -= 1
+            self.total_hold += held
+            self.max_hold = max(self.max_hold, held)
+
+    def snapshot(self):
+        pool = self.engine.pool
+        with self._lock:
+            stats = {
+                'pool': type(pool).__name__,
+                'connects': self.connects,
+                'checkouts': self.checkouts,
+                'checked_out': self.checked_out,
+                'peak_checked_out': self.peak_checked_out,
+                'mean_hold_ms': round(self.total_hold / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                'max_hold_ms': round(self.max_hold * 1000, 3),
+            }
+        if isinstance(pool, sa.pool.QueuePool):
+            stats.update(size=pool.size(), checked_in=pool.checkedin(), overflow=pool.overflow())
+        return stats
+
+def install_pool_stats(app):
+    """Attach PoolStats to every engine; call inside an app context after db.init_app"""
+    app.extensions['pool_stats'] = {name or 'primary': PoolStats(engine)
+                                    for name, engine in db.engines.items()}
+
+def pool_stats(app):
+    return {name: stats.snapshot() for name, stats in app.extensions.get('pool_stats', {}).items()}
+
+# ------ Readiness ------
+
+def _timeout_args(dialect, timeout):
+    """DBAPI connect arguments that bound connecting (and on SQLite, lock waits) by timeout"""
+    if dialect == 'sqlite':
+        return {'timeout': timeout}
+    if dialect in ('postgresql', 'mysql'):
+        return {'connect_timeout': max(1, math.ceil(timeout))}
+    return {}
+
+def probe_engine(engine, timeout):
+    """Unpooled engine on the same database as engine, for readiness probes"""
+    return sa.create_engine(engine.url, poolclass=sa.pool.NullPool,
+                            connect_args=_timeout_args(engine.dialect.name, timeout))
+
+def _probe(engine, probe_sql):
+    """Run probe_sql on a fresh connection; returns the first row"""
+    with engine.connect() as conn:
+        return conn.execute(sa.text(probe_sql)).first()
+
+def _missing_schema(engine, tables):
+    """Tables or columns the models define that the database lacks"""
+    inspector = sa.inspect(engine)
+    existing = set(inspector.get_table_names())
+    missing = []
+    for table in tables:
+        if table.name not in existing:
+            missing.append(table.name)
+            continue
+        present = {column['name'] for column in inspector.get_columns(table.name)}
+        missing.extend(f"{table.name}.{column.name}" for column in table.columns
+                       if column.name not in present)
+    return missing
+
+class ReadinessCheck:
+    def __init__(self, timeout=1.0, cache_ttl=READY_CACHE_TTL):
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self._lock = threading.Lock()
+        self._probing = threading.Lock()
+        self._cached = None
+        self._cached_at = 0.0
+        self._probe_engines = {}
+        # The schema only grows, so once it is current it stays current
+        self._schema_current = False
+
+    def _fresh(self):
+        with self._lock:
+            if self._cached is not None and time.monotonic() - self._cached_at < self.cache_ttl:
+                return self._cached
+            return None
+
+    def check(self):
+        """Return (ready, report), reusing a result younger than cache_ttl"""
+        result = self._fresh()
+        if result is not None:
+            return result
+
+        # One probe at a time, outside _lock; callers arriving meanwhile get
+        # the previous result rather than queueing behind it
+        if not self._probing.acquire(blocking=False):
+            with self._lock:
+                if self._cached is not None:
+                    return self._cached
+            self._probing.acquire()
+        try:
+            result = self._fresh()
+            if result is None:
+                result = self._run()
+                with self._lock:
+                    self._cached, self._cached_at = result, time.monotonic()
+            return result
+        finally:
+            self._probing.release()
+
+    def _probe_engine_for(self, engine):
+        key = str(engine.url)
+        if key not in self._probe_engines:
+            self._probe_engines[key] = probe_engine(engine, self.timeout)
+        return self._probe_engines[key]
+
+    def _targets(self):
+        """(name, engine, tables, probe SQL) for the primary and each entry shard"""
+        if not entry_shards.enabled:
+            return [('primary', db.engine, db.metadata.sorted_tables,
+                     'SELECT id FROM string_pair LIMIT 1')]
+
+        primary_tables = [t for t in db.metadata.sorted_tables if t is not StringEntry.__table__]
+        targets = [('primary', db.engine, primary_tables, 'SELECT id FROM string_pair LIMIT 1')]
+        for shard, engine in enumerate(entry_shards.engines()):
+            targets.append((f'shard_{shard}', engine, [StringEntry.__table__],
+                            'SELECT 1 FROM string_entry LIMIT 1'))
+        return targets
+
+    def _run(self):
+        checks = {}
+        ready = True
+        started = time.perf_counter()
+
+        for name, engine, tables, probe_sql in self._targets():
+            probe_started = time.perf_counter()
+            try:
+                row = _probe(self._probe_engine_for(engine), probe_sql)
+                elapsed = time.perf_counter() - probe_started
+                check = {'ok': elapsed <= self.timeout, 'ms': round(elapsed * 1000, 2)}
+                if not check['ok']:
+                    check['error'] = 'deadline exceeded'
+                if name == 'primary':
+                    checks['patterns'] = {'ok': row is not None}
+            except sa.exc.SQLAlchemyError as e:
+                check = {'ok': False, 'error': str(e.orig if hasattr(e, 'orig') else e).splitlines()[0]}
+            checks[f'database_{name}'] = check
+            ready = ready and check['ok']
+
+        if not self._schema_current and ready:
+            missing = []
+            for name, engine, tables, _ in self._targets():
+                missing.extend(_missing_schema(self._probe_engine_for(engine), tables))
+            self._schema_current = not missing
+            checks['schema'] = {'ok': not missing, 'missing': missing} if missing else {'ok': True}
+        else:
+            # Not re-checked once current; skipped while a database is unreachable
+            checks['schema'] = {'ok': self._schema_current}
+
+        patterns = checks.setdefault('patterns', {'ok': False})
+        ready = ready and checks['schema']['ok'] and patterns['ok']
+        return ready, {
+            'ready': ready,
+            'checks': checks,
+            'ms': round((time.perf_counter() - started) * 1000, 2),
+        }
+
+# ------ Runtime statistics ------
+
+def runtime_stats(app):
+    """Pool, thread and queue statistics for this process"""
+    tracker = app.extensions.get('request_tracker')
+    limiter = app.extensions.get('concurrency_limiter')
+    async_limiter = app.extensions.get('async_limiter')
+    server_threads = app.config.get('SERVER_THREADS', 16)
+    busy = tracker.stats() if tracker else {}
+
+    return {
+        'uptime_s': round(time.monotonic() - PROCESS_STARTED, 1),
+        'pools': pool_stats(app),
+        'threads': {
+            'active': threading.active_count(),
+            'server_threads': server_threads,
+            'busy': busy.get('in_flight'),
+            'peak_busy': busy.get('peak_in_flight'),
+            'utilization': round(busy['in_flight'] / server_threads, 3) if busy and server_threads else None,
+            'requests_served': busy.get('served'),
+        },
+        'queues': {
+            # waiting = requests queued for a slot in each route class
+            'route_classes': limiter.stats() if limiter else None,
+            # Async public routes when served through asgi.py
+            'async_routes': async_limiter.stats() if async_limiter else None,
+            'live_feed': live_feed.feed.stats(),
+        },
+        'consumed_bitmap': consumed_entries.stats(),
+        'submissions': submissions.stats(),
+        'startup': app.extensions.get('startup_timings'),
+    }
@@ -0,0 +1,245 @@
+"""
+Live admin feed pushed to dashboards over Server-Sent Events.
+
+A single poller thread per process tails StringEntry and AdminLog from an
+incremental cursor and fans new or changed rows out to every subscribed
+dashboard. The database sees one short query per interval no matter how
+many admins are watching, and no subscriber holds a connection while idle.
+
+Entry timestamps are taken before their transaction commits, so a row can
+become visible with an updated_at older than rows already seen. The entry
+cursor therefore never moves past now - SETTLE_DELAY: rows inside that
+window are fetched again on every poll and only re-sent if they changed.
+"""
+
+import json
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_
+from models import db, StringEntry, AdminLog
+from sharding import entry_shards
+
+POLL_INTERVAL = 2.0          # seconds between database polls
+SETTLE_DELAY = timedelta(seconds=5)  # longest expected gap between updated_at and commit
+HEARTBEAT_INTERVAL = 15.0    # keep proxies from closing idle streams
+STREAM_LIFETIME = 60.0       # recycle streams (and their thread); EventSource reconnects by itself
+BATCH_LIMIT = 500            # max rows of each kind per query
+CATCH_UP_BATCHES = 10        # batches a reconnecting client may replay
+SUBSCRIBER_QUEUE_SIZE = 100  # pending events before a subscriber is dropped
+
+logger = None
+
+def set_logger(app_logger):
+    global logger
+    logger = app_logger
+
+# ------ Cursors ------
+
+class FeedCursor:
+    """Position in the feed: last (updated_at, id) entry seen and last log id"""
+
+    def __init__(self, entry_ts, entry_id, log_id):
+        self.entry_ts = entry_ts
+        self.entry_id = entry_id
+        self.log_id = log_id
+
+    def encode(self):
+        return f"{self.entry_ts.isoformat()},{self.entry_id},{self.log_id}"
+
+    @classmethod
+    def decode(cls, token):
+        """Parse a cursor token, returning None if it is missing or malformed"""
+        try:
+            entry_ts, entry_id, log_id = token.split(',')
+            return cls(datetime.fromisoformat(entry_ts), int(entry_id), int(log_id))
+        except (AttributeError, ValueError):
+            return None
+
+def settled_before(now=None):
+    """Entries last updated before this are assumed to be committed"""
+    return (now or datetime.utcnow()) - SETTLE_DELAY
+
+def current_cursor(now=None):
+    """Cursor pointing just past the newest settled rows in the database"""
+    horizon = settled_before(now)
+    latest = entry_shards.gather(
+        lambda query: query.with_entities(StringEntry.updated_at, StringEntry.id)
+            .filter(StringEntry.updated_at.isnot(None), StringEntry.updated_at <= horizon)
+            .order_by(StringEntry.updated_at.desc(), StringEntry.id.desc()).limit(1),
+        key=lambda row: (row.updated_at, row.id), reverse=True, limit=1
+    )
+    latest = latest[0] if latest else None
+    log_id = db.session.query(db.func.max(AdminLog.id)).scalar()
+
+    if latest and latest.updated_at:
+        return FeedCursor(latest.updated_at, latest.id, log_id or 0)
+    return FeedCursor(datetime.min, 0, log_id or 0)
+
+def entry_to_dict(entry):
+    return {
+        'id': entry.id,
+        'input_string': entry.input_string,
+        'transformed_string': entry.transformed_string,
+        'ip_address': entry.ip_address,
+        'accessed': bool(entry.accessed),
+        'reaccesible': bool(entry.reaccesible),
+        'created_at': entry.created_at.strftime('%Y-%m-%d %H:%M') if entry.created_at else '',
+    }
+
+def log_to_dict(log):
+    return {
+        'id': log.id,
+        'username': log.username,
+        'ip_address': log.ip_address,
+        'logged_in_at': log.logged_in_at.strftime('%Y-%m-%d %H:%M:%S') if log.logged_in_at else '',
+    }
+
+def fetch_since(cursor, limit=BATCH_LIMIT, now=None):
+    """
+    Return (entries, logs, next_cursor, truncated) for rows newer than cursor.
+    Entries are ordered by (updated_at, id) so changed rows are picked up
+    as well as new ones. next_cursor stops at the last settled entry, so
+    entries inside the settle window are returned again by the next call.
+    """
+    horizon = settled_before(now)
+    entries = entry_shards.gather(
+        lambda query: query.filter(or_(
+            StringEntry.updated_at > cursor.entry_ts,
+            and_(StringEntry.updated_at == cursor.entry_ts, StringEntry.id > cursor.entry_id)
+        )).order_by(StringEntry.updated_at, StringEntry.id).limit(limit),
+        key=lambda entry: (entry.updated_at, entry.id), limit=limit
+    )
+
+    logs = AdminLog.query.filter(AdminLog.id > cursor.log_id) \
+        .order_by(AdminLog.id).limit(limit).all()
+
+    settled = [entry for entry in entries if entry.updated_at <= horizon]
+    next_cursor = FeedCursor(
+        settled[-1].updated_at if settled else cursor.entry_ts,
+        settled[-1].id if settled else cursor.entry_id,
+        logs[-1].id if logs else cursor.log_id
+    )
+    # A full batch of unsettled entries can't be paged past until it settles
+    truncated = (len(entries) == limit and bool(settled)) or len(logs) == limit
+
+    return [entry_to_dict(e) for e in entries], [log_to_dict(l) for l in logs], next_cursor, truncated
+
+def format_event(event, data, event_id=None):
+    """Serialize one SSE message"""
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return '\n'.join(lines) + '\n\n'
+
+# ------ Broadcaster ------
+
+class Subscription:
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.lagged = False
+
+class LiveFeed:
+    """Shares one polling loop between all connected dashboards"""
+
+    def __init__(self, interval=POLL_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._thread = None
+        self._cursor = None
+        self._unsettled = {}  # id -> last published dict, for entries past the cursor
+        self._app = None
+
+    def subscribe(self, app):
+        """
+        Register a subscriber. Must be called inside an app context so the
+        poller cursor can be seeded before the caller runs its catch-up query,
+        which guarantees there is no gap between the two.
+        """
+        subscription = Subscription()
+        with self._lock:
+            self._subscribers.add(subscription)
+            if self._thread is None:
+                self._app = app
+                self._cursor = current_cursor()
+                self._unsettled = {}
+                self._thread = threading.Thread(target=self._run, name='live-feed', daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def stats(self):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        return {
+            'subscribers': len(subscribers),
+            'pending_events': sum(subscription.queue.qsize() for subscription in subscribers),
+            'polling': self._thread is not None,
+        }
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+
+            with self._lock:
+                if not self._subscribers:
+                    # Last dashboard went away; the next subscriber restarts the loop
+                    self._thread = None
+                    return
+
+            try:
+                with self._app.app_context():
+                    entries, logs, self._cursor, _ = fetch_since(self._cursor)
+            except Exception as e:
+                if logger:
+                    logger.error(f"Live feed poll failed: {e}", exc_info=True)
+                continue
+
+            # Unsettled entries come back on every poll; send them again only if they changed
+            previous, self._unsettled = self._unsettled, {entry['id']: entry for entry in entries}
+            entries = [entry for entry in entries if previous.get(entry['id']) != entry]
+
+            if entries or logs:
+                self._publish(format_event('update', {'entries': entries, 'logs': logs},
+                                           self._cursor.encode()))
+
+    def _publish(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(message)
+            except queue.Full:
+                # Too slow to keep up: drop it and let the client resume from its last cursor
+                subscription.lagged = True
+                self.unsubscribe(subscription)
+
+feed = LiveFeed()
+
+def stream(subscription, backlog):
+    """Generator yielding SSE messages for one subscriber until it disconnects"""
+    try:
+        yield "retry: 5000\n\n"
+        for message in backlog:
+            yield message
+
+        started = time.monotonic()
+        while time.monotonic() - started < STREAM_LIFETIME and not subscription.lagged:
+            try:
+                yield subscription.queue.get(timeout=HEARTBEAT_INTERVAL)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+    finally:
+        feed.unsubscribe(subscription)
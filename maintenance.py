@@ -1,15 +1,30 @@
 #!/usr/bin/env python3
 """
 Maintenance script for the String Transformer application.
-Provides a menu-based interface for various maintenance tasks.
+Without arguments it shows the interactive menu; with arguments it runs
+the non-interactive maintenance commands, e.g.
+
+    python maintenance.py integrity-check
+    python maintenance.py vacuum --pages 1000
 """
 
 import os
 import sys
 from utils import show_maintenance_menu
 
+def run_command(args):
+    """Run a non-interactive maintenance command (prints JSON, exits with its status)"""
+    from flask.cli import ScriptInfo
+    from app import create_app
+    from commands import maintenance_cli
+    maintenance_cli.main(args=args, prog_name='maintenance.py',
+                         obj=ScriptInfo(create_app=create_app))
+
 def main():
     """Run the maintenance menu"""
+    if len(sys.argv) > 1:
+        run_command(sys.argv[1:])
+    
     print("String Transformer Application - Maintenance Utility")
     
     # Import app here to avoid circular imports
@@ -1,13 +1,22 @@
 """
-Middleware for handling requests behind a proxy
+Middleware for handling requests behind a proxy and for shedding load
 """
 
+import threading
+import time
+from werkzeug.wsgi import ClosingIterator
+
 class ProxyFix:
     def __init__(self, app, proxy_headers=None):
         self.app = app
         self.proxy_headers = proxy_headers or ['X-Forwarded-For', 'X-Real-IP']
 
     def __call__(self, environ, start_response):
+        self.set_real_ip(environ)
+        return self.app(environ, start_response)
+
+    def set_real_ip(self, environ):
+        """Store the client IP from the proxy headers in REAL_REMOTE_ADDR"""
         # Store the original REMOTE_ADDR
         original_remote_addr = environ.get('REMOTE_ADDR', '')
         
@@ -24,8 +33,107 @@ class ProxyFix:
         # If no proxy headers found, use the original IP
         if 'REAL_REMOTE_ADDR' not in environ:
             environ['REAL_REMOTE_ADDR'] = original_remote_addr
-        
-        return self.app(environ, start_response)
+
+class ConcurrencyLimiter:
+    """
+    Caps concurrent in-flight requests per route class. A request that can't
+    get a slot within queue_timeout is answered immediately with a 503 and a
+    Retry-After header, so a spike on one class degrades predictably instead
+    of queueing without bound and starving the others (e.g. admins).
+    """
+
+    # Checked in order; the first matching path prefix wins
+    ROUTE_CLASSES = [
+        ('/healthz', 'probe'),
+        ('/readyz', 'probe'),
+        ('/static/', 'static'),
+        ('/admin/feed', 'stream'),
+        ('/admin', 'admin'),
+        ('/view/', 'view'),
+    ]
+    DEFAULT_CLASS = 'public'
+    # Classes without a configured limit (e.g. 'probe') are never queued or shed
+    SHED_LOG_INTERVAL = 10.0
+
+    def __init__(self, app, limits, queue_timeout=0.5, retry_after=2, logger=None):
+        self.app = app
+        self.queue_timeout = queue_timeout
+        self.retry_after = str(retry_after)
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._slots = {name: threading.BoundedSemaphore(limit) for name, limit in limits.items()}
+        self._stats = {name: {'limit': limit, 'in_flight': 0, 'waiting': 0, 'served': 0, 'shed': 0}
+                       for name, limit in limits.items()}
+        self._last_shed_log = {}
+
+    def classify(self, path):
+        for prefix, name in self.ROUTE_CLASSES:
+            if path.startswith(prefix):
+                return name
+        return self.DEFAULT_CLASS
+
+    def stats(self):
+        """Snapshot of limit, in-flight, served and shed counts per route class"""
+        with self._lock:
+            return {name: dict(counts) for name, counts in self._stats.items()}
+
+    def __call__(self, environ, start_response):
+        route_class = self.classify(environ.get('PATH_INFO', ''))
+        slots = self._slots.get(route_class)
+        if slots is None:
+            return self.app(environ, start_response)
+
+        if not slots.acquire(blocking=False):
+            # Queue depth: requests waiting for a slot of this class
+            with self._lock:
+                self._stats[route_class]['waiting'] += 1
+            acquired = slots.acquire(timeout=self.queue_timeout)
+            with self._lock:
+                self._stats[route_class]['waiting'] -= 1
+            if not acquired:
+                return self._shed(route_class, start_response)
+
+        with self._lock:
+            self._stats[route_class]['in_flight'] += 1
+
+        released = []
+
+        def release():
+            # The response may be closed more than once; free the slot only once
+            if released:
+                return
+            released.append(True)
+            with self._lock:
+                self._stats[route_class]['in_flight'] -= 1
+                self._stats[route_class]['served'] += 1
+            slots.release()
+
+        try:
+            # Hold the slot until the body is fully sent (covers streamed responses)
+            return ClosingIterator(self.app(environ, start_response), release)
+        except Exception:
+            release()
+            raise
+
+    def _shed(self, route_class, start_response):
+        with self._lock:
+            self._stats[route_class]['shed'] += 1
+            shed = self._stats[route_class]['shed']
+            now = time.monotonic()
+            should_log = now - self._last_shed_log.get(route_class, 0) >= self.SHED_LOG_INTERVAL
+            if should_log:
+                self._last_shed_log[route_class] = now
+
+        if should_log and self.logger:
+            self.logger.warning(f"Load shedding '{route_class}' requests (total shed: {shed})")
+
+        body = b"Service temporarily overloaded, please retry shortly."
+        start_response('503 Service Unavailable', [
+            ('Content-Type', 'text/plain; charset=utf-8'),
+            ('Content-Length', str(len(body))),
+            ('Retry-After', self.retry_after),
+        ])
+        return [body]
 
 def get_real_ip(request):
     """
@@ -35,3 +143,43 @@ def get_real_ip(request):
     if hasattr(request, 'environ') and 'REAL_REMOTE_ADDR' in request.environ:
         return request.environ['REAL_REMOTE_ADDR']
     return request.remote_addr
+
+class RequestTracker:
+    """
+    Counts requests being served (including streamed bodies), i.e. busy
+    worker threads, for the stats endpoint. Sits inside the limiter, so
+    shed requests are not counted.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.served = 0
+
+    def stats(self):
+        with self._lock:
+            return {'in_flight': self.in_flight, 'peak_in_flight': self.peak_in_flight,
+                    'served': self.served}
+
+    def __call__(self, environ, start_response):
+        with self._lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+        finished = []
+
+        def finish():
+            if finished:
+                return
+            finished.append(True)
+            with self._lock:
+                self.in_flight -= 1
+                self.served += 1
+
+        try:
+            return ClosingIterator(self.app(environ, start_response), finish)
+        except Exception:
+            finish()
+            raise
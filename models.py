@@ -1,23 +1,51 @@
+import unicodedata
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import validates
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
+from db_routing import RoutingSession
 
-db = SQLAlchemy()
+# Routes read-only queries to the 'read' bind when one is configured
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+def canonical_key(text):
+    """
+    Lookup key for patterns and inputs: NFKC-normalized, casefolded and with
+    runs of whitespace collapsed, so "Hello  World", "HELLO WORLD" and
+    "ｈｅｌｌｏ world" all match the same pattern.
+    """
+    if text is None:
+        return None
+    # Casefolding can produce sequences NFKC would change again
+    folded = unicodedata.normalize('NFKC', unicodedata.normalize('NFKC', text).casefold())
+    return ' '.join(folded.split())
+
+def canonical_default(source):
+    """Column default computing the key from another column of the same INSERT (ORM or Core)"""
+    return lambda context: canonical_key(context.get_current_parameters().get(source))
 
 class StringEntry(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     input_string = db.Column(db.String(500), nullable=False)
+    input_key = db.Column(db.String(500), default=canonical_default('input_string'))
     transformed_string = db.Column(db.String(500), nullable=False)
     ip_address = db.Column(db.String(50), nullable=False)
     accessed = db.Column(db.Boolean, default=False)
     reaccesible = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    
+    __table_args__ = (
+        # "Has this IP already used this pattern?" check in main.index; also
+        # serves every lookup and prefix scan on ip_address alone
+        db.Index('ix_string_entry_ip_address_input_key', 'ip_address', 'input_key'),
+    )
     
 class AdminLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(50), nullable=False)
     ip_address = db.Column(db.String(50), nullable=False)
-    logged_in_at = db.Column(db.DateTime, default=datetime.utcnow)
+    logged_in_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -35,6 +63,36 @@ class User(db.Model):
 class StringPair(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     input_pattern = db.Column(db.String(500), nullable=False, unique=True)
+    input_key = db.Column(db.String(500), unique=True, index=True,
+                          default=canonical_default('input_pattern'))
     output_pattern = db.Column(db.String(500), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    
+    @validates('input_pattern')
+    def _sync_input_key(self, field, value):
+        # Keep the key in step when a pattern is edited
+        self.input_key = canonical_key(value)
+        return value
+
+class DailyRollup(db.Model):
+    """Pre-aggregated per-day counts read by the dashboard analytics (see rollups.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    metric = db.Column(db.String(20), nullable=False)
+    key = db.Column(db.String(500), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.UniqueConstraint('day', 'metric', 'key', name='uq_daily_rollup_day_metric_key'),
+    )
+
+class RollupDirtyDay(db.Model):
+    """Days to recompute on the next rollup refresh, e.g. after entries were deleted"""
+    day = db.Column(db.Date, primary_key=True)
+    marked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class RollupWatermark(db.Model):
+    """How far each source table has been rolled up"""
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.String(100))
@@ -0,0 +1,319 @@
+"""
+Pre-aggregated daily counts for the dashboard analytics.
+
+DailyRollup holds one count per (day, metric, key):
+
+- pattern      entries created that day, per canonical pattern key
+- state        entries created that day, per current access state: an
+               entry viewed days later moves between states of its
+               creation day, so these are not per-day access counts
+- ip           entries created that day, per client IP
+- admin_login  admin logins that day, per username
+
+A background job finds the days touched since its last run from two
+high-water marks (string_entry.updated_at and the last admin_log id),
+recomputes just those days from the raw rows and replaces their counts.
+Runs are therefore idempotent: workers running the job at the same time
+can't double count. Deleting entries leaves nothing behind to compare with
+a mark, so the delete paths record the days they touched in
+RollupDirtyDay (mark_days_dirty) and the next run recomputes those too.
+"""
+
+import threading
+from collections import Counter
+from datetime import date, datetime, timedelta
+import sqlalchemy as sa
+from models import db, StringEntry, AdminLog, DailyRollup, RollupDirtyDay, RollupWatermark
+from sharding import entry_shards
+from db_routing import pin_primary
+
+# Rows younger than this wait for the next run, so a transaction that
+# commits a little after stamping updated_at can't slip behind the mark
+SETTLE_DELAY = timedelta(seconds=5)
+
+ENTRY_MARK = 'string_entry'
+LOG_MARK = 'admin_log'
+ENTRY_METRICS = ('pattern', 'state', 'ip')
+LOGIN_METRIC = 'admin_login'
+ENTRY_STATES = ('unused', 'accessed', 'reaccessible')
+
+logger = None
+
+def set_logger(app_logger):
+    global logger
+    logger = app_logger
+
+def _as_date(value):
+    # date() comes back as text on SQLite
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(value)
+
+def _day_bounds(day):
+    start = datetime.combine(day, datetime.min.time())
+    return start, start + timedelta(days=1)
+
+def _entry_state():
+    return sa.case(
+        (StringEntry.reaccesible == True, 'reaccessible'),
+        (StringEntry.accessed == True, 'accessed'),
+        else_='unused'
+    )
+
+# ------ Aggregation ------
+
+def _entry_counts(day):
+    """(metric, key, count) for entries created on day, summed over shards"""
+    start, end = _day_bounds(day)
+    groupings = {
+        'pattern': sa.func.coalesce(StringEntry.input_key, ''),
+        'state': _entry_state(),
+        'ip': StringEntry.ip_address,
+    }
+    counts = []
+    for metric, column in groupings.items():
+        totals = Counter()
+        for shard in range(entry_shards.count):
+            rows = entry_shards.query(shard).with_entities(column, sa.func.count()) \
+                .filter(StringEntry.created_at >= start, StringEntry.created_at < end) \
+                .group_by(column).all()
+            for key, count in rows:
+                totals[key] += count
+        counts.extend((metric, key, count) for key, count in totals.items())
+    return counts
+
+def _login_counts(day):
+    start, end = _day_bounds(day)
+    rows = db.session.query(AdminLog.username, sa.func.count()) \
+        .filter(AdminLog.logged_in_at >= start, AdminLog.logged_in_at < end) \
+        .group_by(AdminLog.username).all()
+    return [(LOGIN_METRIC, username, count) for username, count in rows]
+
+def _replace_day(day, metrics, counts):
+    DailyRollup.query.filter(DailyRollup.day == day, DailyRollup.metric.in_(metrics)) \
+        .delete(synchronize_session=False)
+    if counts:
+        db.session.execute(sa.insert(DailyRollup), [
+            {'day': day, 'metric': metric, 'key': key, 'count': count}
+            for metric, key, count in counts
+        ])
+
+def _commit_day(day, metrics, counts):
+    """Replace one day's counts in its own transaction; False if another worker got there first"""
+    try:
+        _replace_day(day, metrics, counts)
+        db.session.commit()
+        return True
+    except sa.exc.IntegrityError:
+        # Another worker replaced the same day first; its counts are as current
+        db.session.rollback()
+        return False
+
+def _get_mark(name):
+    mark = db.session.get(RollupWatermark, name)
+    return mark.value if mark else None
+
+def _set_mark(name, value):
+    db.session.merge(RollupWatermark(name=name, value=value))
+
+# ------ Dirty days ------
+
+def entry_days(*criteria):
+    """Days on which the entries matching criteria were created, over all shards"""
+    day = sa.func.date(StringEntry.created_at)
+    days = set()
+    for shard in range(entry_shards.count):
+        query = entry_shards.query(shard).with_entities(day).filter(*criteria).distinct()
+        days.update(_as_date(value) for (value,) in query if value)
+    return days
+
+def mark_days_dirty(days):
+    """
+    Have the next refresh recompute days whose entries changed without a
+    new updated_at, i.e. were deleted. Call after the change is committed.
+    """
+    if not days:
+        return
+    marked_at = datetime.utcnow()
+    try:
+        for day in days:
+            db.session.merge(RollupDirtyDay(day=day, marked_at=marked_at))
+        db.session.commit()
+    except Exception as e:
+        # The change itself went through; `maint rebuild-rollups` repairs the counts
+        db.session.rollback()
+        if logger:
+            logger.error(f"Could not mark {len(days)} rollup day(s) dirty: {e}", exc_info=True)
+
+# ------ Refresh and rebuild ------
+
+def refresh_rollups(now=None):
+    """
+    Recompute the days touched since the last run; returns them sorted.
+    Each day is committed on its own, so the write lock is held for one
+    day at a time; the marks only advance once every day is done.
+    """
+    # Marks and counts must come from the primary, not a lagging replica
+    pin_primary(db.session)
+    upto = (now or datetime.utcnow()) - SETTLE_DELAY
+
+    entry_mark = _get_mark(ENTRY_MARK)
+    since = datetime.fromisoformat(entry_mark) if entry_mark else None
+    changed_days = set()
+    if since is None:
+        changed_days = entry_days(StringEntry.updated_at <= upto)
+    elif upto > since:
+        changed_days = entry_days(StringEntry.updated_at > since, StringEntry.updated_at <= upto)
+
+    # Marked by the delete paths; a day marked again while it's recomputed stays dirty
+    dirty = {row.day: row.marked_at for row in RollupDirtyDay.query.all()}
+    changed_days |= set(dirty)
+
+    log_mark = int(_get_mark(LOG_MARK) or 0)
+    last_log_id = db.session.query(sa.func.max(AdminLog.id)).scalar() or 0
+    login_days = set()
+    if last_log_id > log_mark:
+        login_days = {
+            _as_date(value) for (value,) in
+            db.session.query(sa.func.date(AdminLog.logged_in_at))
+                .filter(AdminLog.id > log_mark, AdminLog.id <= last_log_id).distinct()
+            if value
+        }
+
+    for day in sorted(changed_days):
+        _commit_day(day, ENTRY_METRICS, _entry_counts(day))
+    for day in sorted(login_days):
+        _commit_day(day, (LOGIN_METRIC,), _login_counts(day))
+
+    for day, marked_at in dirty.items():
+        RollupDirtyDay.query.filter(RollupDirtyDay.day == day, RollupDirtyDay.marked_at <= marked_at) \
+            .delete(synchronize_session=False)
+    if since is None or upto > since:
+        _set_mark(ENTRY_MARK, upto.isoformat())
+    _set_mark(LOG_MARK, str(max(log_mark, last_log_id)))
+    try:
+        db.session.commit()
+    except sa.exc.IntegrityError:
+        # Another worker created the marks first; it covered the same rows
+        db.session.rollback()
+    return sorted(changed_days | login_days)
+
+def _data_range():
+    """First and last day with raw rows or rollups, or (None, None)"""
+    bounds = []
+    for shard in range(entry_shards.count):
+        bounds.extend(entry_shards.query(shard).with_entities(
+            sa.func.min(StringEntry.created_at), sa.func.max(StringEntry.created_at)).one())
+    bounds.extend(db.session.query(sa.func.min(AdminLog.logged_in_at), sa.func.max(AdminLog.logged_in_at)).one())
+    # Include days whose rows were all deleted, so their stale counts are cleared
+    bounds.extend(db.session.query(sa.func.min(DailyRollup.day), sa.func.max(DailyRollup.day)).one())
+
+    days = [_as_date(value) for value in bounds if value is not None]
+    return (min(days), max(days)) if days else (None, None)
+
+def rebuild_rollups(start=None, end=None):
+    """
+    Recompute every day from start to end (inclusive; default: all days
+    with data) from the raw rows. Commits one day at a time so a long
+    rebuild doesn't hold the write lock throughout.
+    """
+    pin_primary(db.session)
+    if start is None or end is None:
+        first, last = _data_range()
+        start, end = start or first, end or last
+    if start is None or end is None or start > end:
+        return {'ok': True, 'days': 0}
+
+    day = start
+    days = 0
+    while day <= end:
+        _replace_day(day, ENTRY_METRICS, _entry_counts(day))
+        _replace_day(day, (LOGIN_METRIC,), _login_counts(day))
+        db.session.commit()
+        day += timedelta(days=1)
+        days += 1
+    return {'ok': True, 'from': start.isoformat(), 'to': end.isoformat(), 'days': days}
+
+# ------ Dashboard ------
+
+def dashboard_analytics(days=14, top=10):
+    """
+    Per-day counts for the last `days` days and the top patterns and IPs,
+    from rollups only. The state columns split each day's new entries by
+    their current state.
+    """
+    last_day = datetime.utcnow().date()
+    first_day = last_day - timedelta(days=days - 1)
+    in_range = (DailyRollup.day >= first_day, DailyRollup.day <= last_day)
+
+    per_day = {first_day + timedelta(days=n): dict.fromkeys(ENTRY_STATES + (LOGIN_METRIC,), 0)
+               for n in range(days)}
+    rows = db.session.query(DailyRollup.day, DailyRollup.metric, DailyRollup.key, DailyRollup.count) \
+        .filter(*in_range, DailyRollup.metric.in_(('state', LOGIN_METRIC))).all()
+    for day, metric, key, count in rows:
+        bucket = per_day[_as_date(day)]
+        if metric == LOGIN_METRIC:
+            bucket[LOGIN_METRIC] += count
+        elif key in bucket:
+            bucket[key] += count
+
+    def top_keys(metric):
+        total = sa.func.sum(DailyRollup.count)
+        return db.session.query(DailyRollup.key, total) \
+            .filter(*in_range, DailyRollup.metric == metric) \
+            .group_by(DailyRollup.key).order_by(total.desc()).limit(top).all()
+
+    daily = []
+    for day, counts in sorted(per_day.items(), reverse=True):
+        entries = sum(counts[state] for state in ENTRY_STATES)
+        daily.append({'day': day, 'entries': entries, 'logins': counts[LOGIN_METRIC],
+                      **{state: counts[state] for state in ENTRY_STATES}})
+
+    return {
+        'days': days,
+        'daily': daily,
+        'max_entries': max((row['entries'] for row in daily), default=0),
+        'top_patterns': top_keys('pattern'),
+        'top_ips': top_keys('ip'),
+        'updated_through': _get_mark(ENTRY_MARK),
+    }
+
+# ------ Background job ------
+
+class RollupJob:
+    """Refreshes the rollups every `interval` seconds on one thread per process"""
+
+    def __init__(self):
+        self._thread = None
+        self._stop = threading.Event()
+        self._app = None
+        self.interval = None
+        self.last_run = None
+
+    def start(self, app, interval):
+        # A thread object copied into a forked child is no longer running
+        if (self._thread is not None and self._thread.is_alive()) or not interval or interval <= 0:
+            return
+        self._app = app
+        self.interval = interval
+        self._thread = threading.Thread(target=self._run, name='rollups', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                with self._app.app_context():
+                    days = refresh_rollups()
+                self.last_run = datetime.utcnow()
+                if days and logger:
+                    logger.info(f"Rolled up {len(days)} day(s): {days[0]} to {days[-1]}")
+            except Exception as e:
+                if logger:
+                    logger.error(f"Rollup refresh failed: {e}", exc_info=True)
+
+rollup_job = RollupJob()
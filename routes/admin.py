@@ -1,7 +1,16 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from models import db, User, AdminLog, StringEntry, StringPair
+from datetime import datetime, timedelta
+from flask import Blueprint, render_template, stream_template, request, redirect, url_for, session, flash, get_flashed_messages, Response, current_app, jsonify, abort
+from jinja2.environment import TemplateStream
+from models import db, User, AdminLog, StringEntry, StringPair, canonical_key
 from utils import login_required, admin_required
 from middleware import get_real_ip
+import live_feed
+import search
+import health
+import rollups
+from db_routing import pin_primary
+from sharding import entry_shards, newest_first
+from consumed_ids import consumed_entries
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 logger = None
@@ -10,6 +19,29 @@ def set_logger(app_logger):
     global logger
     logger = app_logger
 
+@admin_bp.before_request
+def pin_mutations_to_primary():
+    # Admin mutations read then write the same rows; keep them on the primary
+    if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+        pin_primary(db.session)
+
+STREAM_CHUNK_SIZE = 500      # rows fetched per round trip for streamed listings
+STREAM_BUFFER_SIZE = 200     # template fragments joined into one response chunk
+
+def stream_page(template_name, **context):
+    """
+    Render a template as a streamed response: the browser gets the page
+    head at once and rows are rendered as the query iterators produce them.
+    The request (and its DB sessions) stays open until the last chunk.
+    """
+    # The session cookie is sent before the body, so consume flashed messages
+    # now; the template then reads them from the request's cache
+    get_flashed_messages(with_categories=True)
+    
+    body = TemplateStream(stream_template(template_name, **context))
+    body.enable_buffering(STREAM_BUFFER_SIZE)
+    return Response(body, mimetype='text/html')
+
 @admin_bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
@@ -48,23 +80,76 @@ def login():
 @login_required
 def dashboard():
     try:
-        string_entries = StringEntry.query.order_by(StringEntry.created_at.desc()).all()
-        admin_logs = AdminLog.query.order_by(AdminLog.logged_in_at.desc()).all()
-        string_pairs = StringPair.query.order_by(StringPair.created_at.desc()).all()
+        # Taken before the listings so the live feed can only repeat rows, never miss them
+        feed_cursor = live_feed.current_cursor().encode()
+        # Counts come from SQL so the listings below can stay lazy iterators
+        stats = {
+            'entries': entry_shards.count_rows(),
+            'accessed_entries': entry_shards.count_rows(StringEntry.accessed == True),
+            'string_pairs': StringPair.query.count(),
+        }
+        # Short keyset-paginated queries: no read lock is held while the page renders
+        string_entries = entry_shards.stream(StringEntry.created_at, chunk_size=STREAM_CHUNK_SIZE)
+        admin_logs = newest_first(AdminLog.query, AdminLog.logged_in_at, STREAM_CHUNK_SIZE)
+        string_pairs = newest_first(StringPair.query, StringPair.created_at, STREAM_CHUNK_SIZE)
         users = User.query.all()
+        # Charts read only the pre-aggregated rollups
+        analytics = rollups.dashboard_analytics()
         
         logger.info(f"Admin dashboard accessed by user: {session.get('username')}")
         
-        return render_template('admin_dashboard.html', 
-                            string_entries=string_entries, 
-                            admin_logs=admin_logs,
-                            string_pairs=string_pairs,
-                            users=users)
+        return stream_page('admin_dashboard.html', 
+                           stats=stats,
+                           string_entries=string_entries, 
+                           admin_logs=admin_logs,
+                           string_pairs=string_pairs,
+                           users=users,
+                           usernames={user.id: user.username for user in users},
+                           analytics=analytics,
+                           feed_cursor=feed_cursor)
     except Exception as e:
         logger.error(f"Error in admin_dashboard route: {e}", exc_info=True)
         flash("An error occurred while loading the dashboard.", "error")
         return redirect(url_for('main.index'))
 
+@admin_bp.route('/stats')
+@login_required
+@admin_required
+def runtime_stats():
+    """Connection pools, thread utilization and queue depths for this process"""
+    return jsonify(health.runtime_stats(current_app._get_current_object()))
+
+@admin_bp.route('/feed')
+@login_required
+def feed():
+    """Stream new and changed entries and admin logs as Server-Sent Events"""
+    # EventSource resends the last event id when it reconnects
+    token = request.headers.get('Last-Event-ID') or request.args.get('since')
+    cursor = live_feed.FeedCursor.decode(token)
+    
+    subscription = live_feed.feed.subscribe(current_app._get_current_object())
+    
+    # Replay what the client missed; the shared poller takes over from here
+    backlog = []
+    if cursor is not None:
+        for _ in range(live_feed.CATCH_UP_BATCHES):
+            entries, logs, cursor, truncated = live_feed.fetch_since(cursor)
+            if entries or logs:
+                backlog.append(live_feed.format_event(
+                    'update', {'entries': entries, 'logs': logs}, cursor.encode()))
+            if not truncated:
+                break
+        else:
+            # Too far behind to patch incrementally
+            backlog.append(live_feed.format_event('resync', {}))
+    
+    # The DB session is released when this view returns; the stream only reads the queue
+    response = Response(live_feed.stream(subscription, backlog),
+                        mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(lambda: live_feed.feed.unsubscribe(subscription))
+    return response
+
 @admin_bp.route('/string_pair', methods=['POST'])
 @login_required
 def add_string_pair():
@@ -75,7 +160,7 @@ def add_string_pair():
     output_pattern = request.form.get('output_pattern')
     
     # Check if input pattern already exists
-    existing = StringPair.query.filter_by(input_pattern=input_pattern).first()
+    existing = StringPair.query.filter_by(input_key=canonical_key(input_pattern)).first()
     if existing:
         existing.output_pattern = output_pattern
         db.session.commit()
@@ -156,7 +241,9 @@ def toggle_reaccess(entry_id):
     if not session.get('user_id'):
         return redirect(url_for('admin.login'))
     
-    entry = StringEntry.query.get_or_404(entry_id)
+    entry = entry_shards.get(entry_id)
+    if entry is None:
+        abort(404)
     
     # Toggle reaccess state
     entry.reaccesible = not entry.reaccesible
@@ -170,9 +257,11 @@ def toggle_reaccess(entry_id):
     
     # Commit changes to database
     try:
-        db.session.commit()
+        entry_shards.commit(entry)
+        if entry.reaccesible:
+            consumed_entries.discard(entry.id)
     except Exception as e:
-        db.session.rollback()
+        entry_shards.rollback(entry)
         flash(f"Error updating entry: {str(e)}", "error")
     
     return redirect(url_for('admin.dashboard'))
@@ -183,18 +272,168 @@ def delete_entry(entry_id):
     if not session.get('user_id'):
         return redirect(url_for('admin.login'))
     
-    entry = StringEntry.query.get_or_404(entry_id)
+    entry = entry_shards.get(entry_id)
+    if entry is None:
+        abort(404)
     
     try:
-        db.session.delete(entry)
-        db.session.commit()
+        created_on = entry.created_at.date() if entry.created_at else None
+        entry_shards.delete(entry)
+        consumed_entries.discard(entry_id)
+        rollups.mark_days_dirty({created_on} if created_on else set())
         flash(f"String entry #{entry_id} has been deleted successfully.", "success")
     except Exception as e:
-        db.session.rollback()
+        entry_shards.rollback(entry)
         flash(f"Error deleting entry: {str(e)}", "error")
     
     return redirect(url_for('admin.dashboard'))
 
+@admin_bp.route('/search')
+@login_required
+def search_strings():
+    """Search entries by IP prefix or text, and patterns by text"""
+    query = request.args.get('q', '').strip()
+    scope = request.args.get('scope', 'all')
+    limit = request.args.get('limit', search.DEFAULT_LIMIT, type=int)
+    limit = max(1, min(limit, search.MAX_LIMIT))
+    
+    if not query:
+        return jsonify({"success": False, "message": "Search query is required"}), 400
+    
+    try:
+        entries = search.search_entries(query, limit) if scope in ('all', 'entries') else []
+        pairs = search.search_pairs(query, limit) if scope in ('all', 'pairs') else []
+    except Exception as e:
+        logger.error(f"Error searching for '{query}': {e}", exc_info=True)
+        return jsonify({"success": False, "message": "Search failed"}), 500
+    
+    return jsonify({
+        "success": True,
+        "query": query,
+        "entries": [live_feed.entry_to_dict(entry) for entry in entries],
+        "pairs": [search.pair_to_dict(pair) for pair in pairs]
+    })
+
+# Column updates applied by each bulk action; None means delete
+BULK_ENTRY_ACTIONS = {
+    'enable_reaccess': {'reaccesible': True, 'accessed': False},
+    'disable_reaccess': {'reaccesible': False},
+    'delete': None,
+}
+MAX_BULK_IDS = 5000
+
+def parse_filter_date(value, end=False):
+    """Parse an ISO date/datetime filter; a bare end date covers the whole day"""
+    parsed = datetime.fromisoformat(value)
+    if end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+def filter_text(params, name):
+    """Stripped value of an optional text filter, or None; ValueError unless it is a string"""
+    value = params.get(name)
+    if value is None or value == '':
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"'{name}' must be a string")
+    return value.strip() or None
+
+def parse_entry_ids(ids):
+    """Entry ids from a list (or comma-separated string) of integers"""
+    if isinstance(ids, str):
+        ids = ids.split(',')
+    if not isinstance(ids, list):
+        raise ValueError("'ids' must be a list of integers")
+    parsed = []
+    for entry_id in ids:
+        # bool is an int subclass; floats would be silently truncated
+        if isinstance(entry_id, bool) or not isinstance(entry_id, (int, str)):
+            raise ValueError("'ids' must be a list of integers")
+        parsed.append(int(entry_id))
+    return parsed
+
+def build_entry_criteria(params):
+    """
+    Translate a bulk selection (an id list and/or ip, pattern and date range
+    filters) into SQL criteria. Returns (criteria, ids, ip_address), where
+    ids and ip_address are None unless given. Raises ValueError on invalid
+    or empty input.
+    """
+    criteria = []
+    
+    ids = params.get('ids') or None
+    if ids:
+        ids = parse_entry_ids(ids)
+        if len(ids) > MAX_BULK_IDS:
+            raise ValueError(f"At most {MAX_BULK_IDS} ids can be selected at once")
+        criteria.append(StringEntry.id.in_(ids))
+    
+    ip_address = filter_text(params, 'ip')
+    pattern = filter_text(params, 'pattern')
+    date_from = filter_text(params, 'date_from')
+    date_to = filter_text(params, 'date_to')
+    if ip_address:
+        criteria.append(StringEntry.ip_address == ip_address)
+    if pattern:
+        criteria.append(StringEntry.input_key == canonical_key(pattern))
+    if date_from:
+        criteria.append(StringEntry.created_at >= parse_filter_date(date_from))
+    if date_to:
+        criteria.append(StringEntry.created_at < parse_filter_date(date_to, end=True))
+    
+    if not criteria:
+        raise ValueError("Select entries by id or provide at least one filter")
+    return criteria, ids, ip_address
+
+@admin_bp.route('/entries/bulk', methods=['POST'])
+@login_required
+def bulk_entries():
+    """Apply one action to many entries with a single UPDATE or DELETE (per shard)"""
+    params = request.get_json(silent=True)
+    if not isinstance(params, dict):
+        params = request.form.to_dict()
+        params['ids'] = request.form.getlist('ids')
+    
+    action = params.get('action')
+    if action not in BULK_ENTRY_ACTIONS:
+        return jsonify({"success": False, "message": f"Unknown action: {action}"}), 400
+    
+    try:
+        criteria, ids, ip_address = build_entry_criteria(params)
+    except (TypeError, ValueError) as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    
+    # With sharding, an IP or id list narrows the statement to the owning shards
+    try:
+        values = BULK_ENTRY_ACTIONS[action]
+        if values is None:
+            # Deleted rows leave no updated_at behind for the rollups to notice
+            days = rollups.entry_days(*criteria)
+            affected = entry_shards.delete_where(criteria, ids=ids, ip_address=ip_address)
+            rollups.mark_days_dirty(days)
+        else:
+            affected = entry_shards.update_where(criteria, values, ids=ids, ip_address=ip_address)
+        
+        # Keep the consumed-id bitmap exact. Clearing a superset of the
+        # affected ids is safe (they just fall through to the database);
+        # filter-only selections need a reload.
+        if action in ('enable_reaccess', 'delete'):
+            if ids is not None:
+                consumed_entries.discard_many(ids)
+            else:
+                consumed_entries.load()
+    except Exception as e:
+        logger.error(f"Error in bulk {action}: {e}", exc_info=True)
+        return jsonify({"success": False, "message": "Error updating entries"}), 500
+    
+    logger.info(f"Bulk {action} on {affected} entries by user: {session.get('username')}")
+    return jsonify({
+        "success": True,
+        "action": action,
+        "affected": affected,
+        "message": f"{action.replace('_', ' ').capitalize()}: {affected} entries"
+    })
+
 @admin_bp.route('/change_password', methods=['POST'])
 @login_required
 def change_password():
@@ -250,16 +489,17 @@ def clear_all_entries():
     
     try:
         # Count entries before deletion for logging and feedback
-        entries_count = StringEntry.query.count()
+        entries_count = entry_shards.count_rows()
         
         # Delete all entries
-        StringEntry.query.delete()
-        db.session.commit()
+        days = rollups.entry_days()
+        entry_shards.delete_where([])
+        consumed_entries.load()
+        rollups.mark_days_dirty(days)
         
         logger.warning(f"All string entries ({entries_count}) cleared by admin: {session.get('username')}")
         flash(f"Successfully cleared {entries_count} string entries", "success")
     except Exception as e:
-        db.session.rollback()
         logger.error(f"Error clearing entries: {str(e)}", exc_info=True)
         flash(f"Error clearing entries: {str(e)}", "error")
         
@@ -0,0 +1,20 @@
+from flask import Blueprint, jsonify, current_app
+
+health_bp = Blueprint('health', __name__)
+
+# Probes skip the route-class limiter (see middleware.ConcurrencyLimiter)
+
+@health_bp.route('/healthz')
+def healthz():
+    """Liveness: the process is up and serving; no I/O"""
+    response = jsonify({'status': 'ok'})
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@health_bp.route('/readyz')
+def readyz():
+    """Readiness: databases readable within READY_TIMEOUT, schema current, patterns loaded"""
+    ready, report = current_app.extensions['readiness'].check()
+    response = jsonify(report)
+    response.headers['Cache-Control'] = 'no-store'
+    return response, 200 if ready else 503
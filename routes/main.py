@@ -1,7 +1,11 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
-from models import db, StringEntry
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort
+from models import db, canonical_key
 from utils import transform_string
 from middleware import get_real_ip
+from consumed_ids import consumed_entries
+from db_routing import pin_primary
+from sharding import entry_shards
+from submissions import submissions
 
 main_bp = Blueprint('main', __name__)
 logger = None
@@ -10,6 +14,97 @@ def set_logger(app_logger):
     global logger
     logger = app_logger
 
+def submission_key(ip_address, input_string):
+    """Duplicate submissions share this key; None when there is nothing to key on"""
+    if input_string is None:
+        return None
+    return (ip_address, canonical_key(input_string))
+
+def replayable(outcome):
+    """Only a redirect to a still-unused entry may be replayed to later duplicates"""
+    kind, entry_id = outcome
+    return kind == 'view' and entry_id not in consumed_entries
+
+def forget_submission(entry):
+    """Once an entry is used, a repeat of its submission must run again, not replay the redirect"""
+    submissions.discard(submission_key(entry.ip_address, entry.input_string))
+
+def log_duplicate(outcome, ip_address, input_string):
+    kind, entry_id = outcome
+    if kind == 'view':
+        logger.info(f"Reused entry #{entry_id} for duplicate submission from IP: {ip_address}")
+    else:
+        logger.info(f"Duplicate submission from IP: {ip_address} for string: {input_string} answered with '{kind}'")
+
+def respond(outcome):
+    """Response for a submission outcome; built per request, so duplicates get their own"""
+    kind, entry_id = outcome
+    if kind == 'view':
+        # Redirect to view page
+        return redirect(url_for('main.view_result', entry_id=entry_id))
+    if kind == 'no_match':
+        return render_template('no_match.html')
+    if kind == 'already_accessed':
+        return render_template('no_match.html', message="This pattern has already been accessed from your IP address.")
+    flash("An error occurred. Please try again later.", "error")
+    return redirect(url_for('main.index'))
+
+def submit(input_string, ip_address):
+    """Process one transformation request; returns its (kind, entry_id) outcome"""
+    try:
+        # Check if there's a matching pattern
+        transformed = transform_string(input_string)
+        
+        # If no pattern found
+        if transformed is None:
+            logger.info(f"No matching pattern found for: {input_string}")
+            return ('no_match', None)
+        
+        # The entry check decides what to write, so read it from the primary
+        pin_primary(db.session)
+        
+        # Check if this IP has already viewed this pattern
+        existing = entry_shards.find(
+            ip_address,
+            input_key=canonical_key(input_string),
+            accessed=True
+        )
+        
+        if existing and not existing.reaccesible:
+            logger.info(f"IP {ip_address} already accessed pattern '{input_string}'")
+            return ('already_accessed', None)
+        
+        # Create new entry or update existing
+        if existing and existing.reaccesible:
+            # Reset the existing entry
+            existing.accessed = False
+            existing.reaccesible = False
+            entry_shards.commit(existing)
+            entry_id = existing.id
+            consumed_entries.discard(entry_id)
+            logger.info(f"Reset existing entry #{entry_id} for reaccess by IP: {ip_address}")
+        else:
+            # Create new entry
+            new_entry = entry_shards.create(
+                input_string=input_string.lower(),
+                transformed_string=transformed,
+                ip_address=ip_address,
+                accessed=False,
+                reaccesible=False
+            )
+            entry_id = new_entry.id
+            # SQLite may reuse the id of a deleted row
+            consumed_entries.discard(entry_id)
+            logger.info(f"Created new string entry #{entry_id} for IP: {ip_address}")
+        
+        return ('view', entry_id)
+            
+    except Exception as e:
+        logger.error(f"Error in index route for IP {ip_address}: {e}", exc_info=True)
+        db.session.rollback()
+        entry_shards.rollback_all()
+        return ('error', None)
+
 @main_bp.route('/', methods=['GET', 'POST'])
 def index():
     if request.method == 'POST':
@@ -18,56 +113,15 @@ def index():
         
         logger.info(f"Transformation request from IP: {ip_address} for string: {input_string}")
         
-        try:
-            # Check if there's a matching pattern
-            transformed = transform_string(input_string)
-            
-            # If no pattern found
-            if transformed is None:
-                logger.info(f"No matching pattern found for: {input_string}")
-                return render_template('no_match.html')
-            
-            # Check if this IP has already viewed this pattern
-            existing = StringEntry.query.filter_by(
-                ip_address=ip_address, 
-                input_string=input_string.lower(),
-                accessed=True
-            ).first()
-            
-            if existing and not existing.reaccesible:
-                logger.info(f"IP {ip_address} already accessed pattern '{input_string}'")
-                return render_template('no_match.html', message="This pattern has already been accessed from your IP address.")
-            
-            # Create new entry or update existing
-            if existing and existing.reaccesible:
-                # Reset the existing entry
-                existing.accessed = False
-                existing.reaccesible = False
-                db.session.commit()
-                entry_id = existing.id
-                logger.info(f"Reset existing entry #{entry_id} for reaccess")
-            else:
-                # Create new entry
-                new_entry = StringEntry(
-                    input_string=input_string.lower(),
-                    transformed_string=transformed,
-                    ip_address=ip_address,
-                    accessed=False,
-                    reaccesible=False
-                )
-                db.session.add(new_entry)
-                db.session.commit()
-                entry_id = new_entry.id
-                logger.info(f"Created new string entry #{entry_id}")
-            
-            # Redirect to view page
-            return redirect(url_for('main.view_result', entry_id=entry_id))
-                
-        except Exception as e:
-            logger.error(f"Error in index route: {e}", exc_info=True)
-            db.session.rollback()
-            flash("An error occurred. Please try again later.", "error")
-            return redirect(url_for('main.index'))
+        # Identical submissions in flight or just completed share one outcome
+        outcome, shared = submissions.run(
+            submission_key(ip_address, input_string),
+            lambda: submit(input_string, ip_address),
+            replayable=replayable
+        )
+        if shared:
+            log_duplicate(outcome, ip_address, input_string)
+        return respond(outcome)
     
     return render_template('index.html')
 
@@ -75,7 +129,16 @@ def index():
 def view_result(entry_id):
     # Get the entry
     try:
-        entry = StringEntry.query.get_or_404(entry_id)
+        # Already-used links are answered without a database read
+        if entry_id in consumed_entries:
+            logger.info(f"View request for entry #{entry_id} - rejected by consumed-id bitmap")
+            return render_template('no_match.html')
+        
+        # Claiming is read-modify-write; use the primary
+        pin_primary(db.session)
+        entry = entry_shards.get(entry_id)
+        if entry is None:
+            abort(404)
         
         # Enhanced access control
         logger.info(f"View request for entry #{entry_id} - accessed: {entry.accessed}, reaccesible: {entry.reaccesible}")
@@ -83,6 +146,8 @@ def view_result(entry_id):
         # Check if the entry has been accessed already and reaccess is disabled
         if entry.accessed and not entry.reaccesible:
             logger.info(f"Access denied to entry #{entry_id} - already viewed and reaccess not enabled")
+            consumed_entries.add(entry_id)
+            forget_submission(entry)
             return render_template('no_match.html')
         
         # Before showing the result, mark it as accessed and disable reaccess
@@ -91,10 +156,12 @@ def view_result(entry_id):
         
         # Save changes
         try:
-            db.session.commit()
+            entry_shards.commit(entry)
+            consumed_entries.add(entry_id)
+            forget_submission(entry)
             logger.info(f"Entry #{entry_id} marked as accessed and reaccess disabled")
         except Exception as e:
-            db.session.rollback()
+            entry_shards.rollback(entry)
             logger.error(f"Error updating entry status: {e}", exc_info=True)
             flash("An error occurred while processing your request.", "error")
             return redirect(url_for('main.index'))
@@ -0,0 +1,173 @@
+"""
+Async versions of the public views, served by the ASGI entry point.
+
+Each handler mirrors its sync view (routes/main.py, app/mobile_routes.py)
+step for step, but awaits the database through AsyncEntryStore, so a
+request waiting on SQLite costs a coroutine rather than a worker thread.
+They run inside a normal Flask request context, so templates, url_for,
+flash and the error handlers behave as in the sync views.
+"""
+
+from flask import render_template, request, redirect, url_for, flash, abort, current_app
+from models import StringEntry, canonical_key
+from middleware import get_real_ip
+from consumed_ids import consumed_entries
+from app import mobile_routes
+from routes.main import submission_key, replayable, forget_submission, log_duplicate, respond
+from submissions import submissions
+
+logger = None
+
+def set_logger(app_logger):
+    global logger
+    logger = app_logger
+
+def entry_store():
+    return current_app.extensions['async_entries']
+
+async def submit(input_string, ip_address):
+    """Async version of routes.main.submit; returns the same (kind, entry_id) outcomes"""
+    store = entry_store()
+    try:
+        # Check if there's a matching pattern
+        transformed = await store.transform_string(input_string)
+
+        # If no pattern found
+        if transformed is None:
+            logger.info(f"No matching pattern found for: {input_string}")
+            return ('no_match', None)
+
+        async with store.session_for_ip(ip_address) as session:
+            # Check if this IP has already viewed this pattern
+            existing = await store.find(
+                session,
+                ip_address,
+                input_key=canonical_key(input_string),
+                accessed=True
+            )
+
+            if existing and not existing.reaccesible:
+                logger.info(f"IP {ip_address} already accessed pattern '{input_string}'")
+                return ('already_accessed', None)
+
+            # Create new entry or update existing
+            if existing and existing.reaccesible:
+                # Reset the existing entry
+                existing.accessed = False
+                existing.reaccesible = False
+                await session.commit()
+                entry_id = existing.id
+                consumed_entries.discard(entry_id)
+                logger.info(f"Reset existing entry #{entry_id} for reaccess by IP: {ip_address}")
+            else:
+                # Create new entry
+                entry_id = await store.create(
+                    session,
+                    input_string=input_string.lower(),
+                    transformed_string=transformed,
+                    ip_address=ip_address,
+                    accessed=False,
+                    reaccesible=False
+                )
+                # SQLite may reuse the id of a deleted row
+                consumed_entries.discard(entry_id)
+                logger.info(f"Created new string entry #{entry_id} for IP: {ip_address}")
+
+        return ('view', entry_id)
+
+    except Exception as e:
+        # Leaving the session block rolled back any open transaction
+        logger.error(f"Error in index route for IP {ip_address}: {e}", exc_info=True)
+        return ('error', None)
+
+async def index():
+    if request.method == 'POST':
+        input_string = request.form.get('input_string')
+        ip_address = get_real_ip(request)
+
+        logger.info(f"Transformation request from IP: {ip_address} for string: {input_string}")
+
+        # Shares the duplicate table with the sync view
+        outcome, shared = await submissions.run_async(
+            submission_key(ip_address, input_string),
+            lambda: submit(input_string, ip_address),
+            replayable=replayable
+        )
+        if shared:
+            log_duplicate(outcome, ip_address, input_string)
+        return respond(outcome)
+
+    return render_template('index.html')
+
+async def view_result(entry_id):
+    try:
+        # Already-used links are answered without a database read
+        if entry_id in consumed_entries:
+            logger.info(f"View request for entry #{entry_id} - rejected by consumed-id bitmap")
+            return render_template('no_match.html')
+
+        async with entry_store().session_for_id(entry_id) as session:
+            entry = await session.get(StringEntry, entry_id)
+            if entry is None:
+                abort(404)
+
+            logger.info(f"View request for entry #{entry_id} - accessed: {entry.accessed}, reaccesible: {entry.reaccesible}")
+
+            # Check if the entry has been accessed already and reaccess is disabled
+            if entry.accessed and not entry.reaccesible:
+                logger.info(f"Access denied to entry #{entry_id} - already viewed and reaccess not enabled")
+                consumed_entries.add(entry_id)
+                forget_submission(entry)
+                return render_template('no_match.html')
+
+            # Before showing the result, mark it as accessed and disable reaccess
+            entry.accessed = True
+            entry.reaccesible = False
+
+            # Save changes
+            try:
+                await session.commit()
+                consumed_entries.add(entry_id)
+                forget_submission(entry)
+                logger.info(f"Entry #{entry_id} marked as accessed and reaccess disabled")
+            except Exception as e:
+                await session.rollback()
+                logger.error(f"Error updating entry status: {e}", exc_info=True)
+                flash("An error occurred while processing your request.", "error")
+                return redirect(url_for('main.index'))
+
+        # Show result
+        return render_template('result.html',
+                            input_string=entry.input_string,
+                            result=entry.transformed_string,
+                            one_time=True,
+                            entry_id=entry_id)
+    except Exception as e:
+        logger.error(f"Error in view_result route: {e}", exc_info=True)
+        return render_template('error.html', error="An error occurred while processing your request")
+
+# ------ Mobile API ------
+# The payloads need no I/O yet, so these run straight on the event loop;
+# once they read the database they should await AsyncEntryStore as above
+
+async def get_bootstrap():
+    return mobile_routes.get_bootstrap()
+
+async def get_stats():
+    return mobile_routes.get_stats()
+
+async def get_games():
+    return mobile_routes.get_games()
+
+async def update_profile():
+    return mobile_routes.update_profile()
+
+# Flask endpoint -> async handler; other endpoints are served by the WSGI app
+ASYNC_VIEWS = {
+    'main.index': index,
+    'main.view_result': view_result,
+    'mobile.get_bootstrap': get_bootstrap,
+    'mobile.get_stats': get_stats,
+    'mobile.get_games': get_games,
+    'mobile.update_profile': update_profile,
+}
@@ -0,0 +1,222 @@
+"""
+Server-side search over string entries and patterns.
+
+Text is matched through SQLite FTS5 indexes that mirror string_entry and
+string_pair via triggers, so they stay in sync without any application
+code on the write path. IP lookups use a prefix range scan on the
+(ip_address, input_key) index. Databases without FTS5 fall back to LIKE.
+"""
+
+import re
+from sqlalchemy import text, or_
+from models import db, StringEntry, StringPair
+from sharding import entry_shards
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+# FTS table -> (content table, indexed columns)
+FTS_TABLES = {
+    'string_entry_fts': ('string_entry', ('input_string', 'ip_address')),
+    'string_pair_fts': ('string_pair', ('input_pattern', 'output_pattern')),
+}
+
+# Queries shaped like the start of an address use the index on ip_address
+# rather than text search. IPv6 needs a digit, so words made of hex
+# letters (e.g. "cafe:dead") are still searched as text
+IP_PREFIX_RE = re.compile(
+    r'^(?:\d{1,3}\.(?:\d{1,3}\.){0,2}\d{0,3}'                # 10.  192.168.1.20
+    r'|(?=.*\d)[0-9a-fA-F]{0,4}(?::[0-9a-fA-F]{0,4}){1,7})$'   # 2001:db8:  fe80::1
+)
+
+logger = None
+fts_enabled = False
+
+def set_logger(app_logger):
+    global logger
+    logger = app_logger
+
+# ------ Index maintenance ------
+
+def _fts_statements(fts_table, content_table, columns):
+    cols = ', '.join(columns)
+    new_values = ', '.join(f'new.{c}' for c in columns)
+    old_values = ', '.join(f'old.{c}' for c in columns)
+
+    triggers = {
+        f'{fts_table}_ai': f"""
+            CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {content_table} BEGIN
+                INSERT INTO {fts_table}(rowid, {cols}) VALUES (new.id, {new_values});
+            END""",
+        f'{fts_table}_ad': f"""
+            CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {content_table} BEGIN
+                INSERT INTO {fts_table}({fts_table}, rowid, {cols}) VALUES ('delete', old.id, {old_values});
+            END""",
+        # Only the indexed columns; access flag updates never touch the index
+        f'{fts_table}_au': f"""
+            CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE OF {cols} ON {content_table} BEGIN
+                INSERT INTO {fts_table}({fts_table}, rowid, {cols}) VALUES ('delete', old.id, {old_values});
+                INSERT INTO {fts_table}(rowid, {cols}) VALUES (new.id, {new_values});
+            END""",
+    }
+    create_table = f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5(
+            {cols}, content='{content_table}', content_rowid='id', prefix='2 3'
+        )"""
+    return create_table, triggers
+
+def setup_search_index():
+    """
+    Create the FTS tables and sync triggers if they are missing. Dropping a
+    content table (e.g. a database reset) drops its triggers too, so any
+    missing trigger means the index must be rebuilt from the content table.
+    Entry indexes live next to the entries, i.e. in every shard.
+    """
+    global fts_enabled
+
+    engines = {db.engine} | set(entry_shards.engines())
+    if any(engine.dialect.name != 'sqlite' for engine in engines):
+        fts_enabled = False
+        return False
+
+    try:
+        for engine, fts_table, content_table, columns in _fts_targets():
+            _setup_fts_table(engine, fts_table, content_table, columns)
+        fts_enabled = True
+    except Exception as e:
+        # Typically "no such module: fts5"; search degrades to LIKE
+        fts_enabled = False
+        if logger:
+            logger.warning(f"Full-text search unavailable, using LIKE fallback: {e}")
+
+    return fts_enabled
+
+def detect_search_index():
+    """
+    Enable FTS search if every index and its triggers already exist, without
+    creating anything. For workers started with INIT_DB=False, whose
+    database was prepared by another process.
+    """
+    global fts_enabled
+
+    engines = {db.engine} | set(entry_shards.engines())
+    if any(engine.dialect.name != 'sqlite' for engine in engines):
+        fts_enabled = False
+        return False
+
+    missing = []
+    try:
+        for engine, fts_table, content_table, columns in _fts_targets():
+            triggers = _fts_statements(fts_table, content_table, columns)[1]
+            with engine.connect() as conn:
+                if not {fts_table, *triggers} <= _schema_names(conn):
+                    missing.append(f"{fts_table} ({engine.url.database})")
+                    continue
+                # Fails with "no such module: fts5" on SQLite builds without FTS5
+                conn.execute(text(f"SELECT rowid FROM {fts_table} LIMIT 0"))
+    except Exception as e:
+        missing.append(str(e))
+
+    fts_enabled = not missing
+    if missing and logger:
+        logger.warning(f"Full-text search unavailable, using LIKE fallback: missing or unusable "
+                       f"{', '.join(missing)}; a startup with INIT_DB=True sets the index up")
+    return fts_enabled
+
+def _fts_targets():
+    """(engine, fts_table, content_table, columns) for every index"""
+    for fts_table, (content_table, columns) in FTS_TABLES.items():
+        targets = entry_shards.engines() if content_table == 'string_entry' else [db.engine]
+        for engine in targets:
+            yield engine, fts_table, content_table, columns
+
+def _schema_names(conn):
+    return {row[0] for row in conn.execute(text(
+        "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')"))}
+
+def _setup_fts_table(engine, fts_table, content_table, columns):
+    with engine.begin() as conn:
+        existing = _schema_names(conn)
+
+        create_table, triggers = _fts_statements(fts_table, content_table, columns)
+        needs_rebuild = fts_table not in existing or not set(triggers) <= existing
+
+        conn.execute(text(create_table))
+        for statement in triggers.values():
+            conn.execute(text(statement))
+
+        if needs_rebuild:
+            conn.execute(text(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')"))
+            if logger:
+                logger.info(f"Rebuilt search index {fts_table} ({engine.url.database})")
+
+# ------ Queries ------
+
+def build_match_query(query):
+    """Turn free text into an FTS5 expression of quoted prefix terms"""
+    terms = query.split()
+    return ' AND '.join('"' + term.replace('"', '""') + '"*' for term in terms)
+
+def _ip_prefix_range(prefix):
+    # Every string starting with prefix sorts in [prefix, prefix + U+10FFFF)
+    return StringEntry.ip_address >= prefix, StringEntry.ip_address < prefix + '\U0010ffff'
+
+def _fts_ids(session, fts_table, query, limit):
+    rows = session.execute(text(
+        f"SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH :match ORDER BY rowid DESC LIMIT :limit"
+    ), {'match': build_match_query(query), 'limit': limit})
+    return [row[0] for row in rows]
+
+def _load_in_order(query, model, ids):
+    if not ids:
+        return []
+    by_id = {row.id: row for row in query.filter(model.id.in_(ids)).all()}
+    return [by_id[i] for i in ids if i in by_id]
+
+def search_entries(query, limit=DEFAULT_LIMIT):
+    """Newest entries whose IP starts with query, or whose text matches it"""
+    query = query.strip()
+    if not query:
+        return []
+
+    if fts_enabled and not IP_PREFIX_RE.match(query):
+        entries = []
+        for shard in range(entry_shards.count):
+            ids = _fts_ids(entry_shards.session(shard), 'string_entry_fts', query, limit)
+            entries.extend(_load_in_order(entry_shards.query(shard), StringEntry, ids))
+        entries.sort(key=lambda entry: entry.id, reverse=True)
+        return entries[:limit]
+
+    if IP_PREFIX_RE.match(query):
+        criteria = _ip_prefix_range(query)
+    else:
+        like = f"%{query.lower()}%"
+        criteria = (or_(StringEntry.input_string.like(like), StringEntry.ip_address.like(like)),)
+
+    return entry_shards.gather(
+        lambda q: q.filter(*criteria).order_by(StringEntry.id.desc()).limit(limit),
+        key=lambda entry: entry.id, reverse=True, limit=limit
+    )
+
+def search_pairs(query, limit=DEFAULT_LIMIT):
+    """Newest patterns whose input or output matches query"""
+    query = query.strip()
+    if not query:
+        return []
+
+    if fts_enabled:
+        return _load_in_order(StringPair.query, StringPair,
+                              _fts_ids(db.session, 'string_pair_fts', query, limit))
+
+    like = f"%{query}%"
+    return StringPair.query.filter(or_(
+        StringPair.input_pattern.like(like), StringPair.output_pattern.like(like)
+    )).order_by(StringPair.id.desc()).limit(limit).all()
+
+def pair_to_dict(pair):
+    return {
+        'id': pair.id,
+        'input_pattern': pair.input_pattern,
+        'output_pattern': pair.output_pattern,
+        'created_at': pair.created_at.strftime('%Y-%m-%d %H:%M') if pair.created_at else '',
+    }
@@ -0,0 +1,249 @@
+"""
+Optional hash-sharded storage for StringEntry.
+
+With ENTRY_SHARDS=N (N > 1), string entries live in N separate database
+files, chosen by a stable hash of ip_address, so inserts and claims on
+different shards don't serialize on one SQLite write lock. Entry ids stay
+globally unique and encode their shard: every id in shard k satisfies
+id % N == k, so /view/<id> goes straight to the right file. Listings run
+the same query on every shard and merge the results (scatter-gather).
+
+With the default ENTRY_SHARDS=1 the same API runs on db.session, so
+callers don't need to know which mode is active. N is fixed once data has
+been written; changing it requires moving the entries.
+"""
+
+import heapq
+import zlib
+import sqlalchemy as sa
+from flask import current_app, g
+from models import db, StringEntry
+
+SHARD_BIND = 'entries_{}'
+
+def configure_shard_binds(config):
+    """
+    Add one bind per shard to SQLALCHEMY_BINDS before db.init_app. Shard
+    URIs come from ENTRY_SHARD_URI (with a {shard} placeholder) or are
+    derived from the main SQLite file name. Returns the shard count.
+    """
+    count = int(config.get('ENTRY_SHARDS', 1) or 1)
+    if count <= 1:
+        return 1
+
+    template = config.get('ENTRY_SHARD_URI')
+    if template:
+        uris = [template.format(shard=shard) for shard in range(count)]
+    else:
+        url = sa.engine.make_url(config['SQLALCHEMY_DATABASE_URI'])
+        if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+            raise ValueError("ENTRY_SHARD_URI is required unless the database is a SQLite file")
+        # strings.db -> strings.entries-0.db, strings.entries-1.db, ...
+        stem, dot, suffix = url.database.rpartition('.')
+        uris = [url.set(database=f"{stem}.entries-{shard}.{suffix}" if dot
+                        else f"{url.database}.entries-{shard}")
+                for shard in range(count)]
+
+    binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+    for shard, uri in enumerate(uris):
+        binds[SHARD_BIND.format(shard)] = uri
+    config['SQLALCHEMY_BINDS'] = binds
+    return count
+
+class EntryShards:
+    """Routes StringEntry reads and writes to the owning shard"""
+
+    @property
+    def count(self):
+        return int(current_app.config.get('ENTRY_SHARDS', 1) or 1)
+
+    @property
+    def enabled(self):
+        return self.count > 1
+
+    # ------ Routing ------
+
+    def shard_for_ip(self, ip_address):
+        # crc32 rather than hash(): must agree across processes and restarts
+        return zlib.crc32(ip_address.encode('utf-8')) % self.count
+
+    def shard_for_id(self, entry_id):
+        return entry_id % self.count
+
+    def engine(self, shard):
+        return db.engines[SHARD_BIND.format(shard)] if self.enabled else db.engine
+
+    def engines(self):
+        return [self.engine(shard) for shard in range(self.count)]
+
+    def session(self, shard):
+        """Session for one shard, shared for the rest of the app context"""
+        if not self.enabled:
+            return db.session
+
+        sessions = g.setdefault('_entry_shard_sessions', {})
+        if shard not in sessions:
+            sessions[shard] = sa.orm.Session(bind=self.engine(shard), expire_on_commit=False)
+        return sessions[shard]
+
+    def sessions(self):
+        return [self.session(shard) for shard in range(self.count)]
+
+    def query(self, shard):
+        return self.session(shard).query(StringEntry)
+
+    def close_sessions(self, exception=None):
+        for session in g.pop('_entry_shard_sessions', {}).values():
+            session.close()
+
+    # ------ Single-entry operations ------
+
+    def get(self, entry_id):
+        return self.session(self.shard_for_id(entry_id)).get(StringEntry, entry_id)
+
+    def find(self, ip_address, **filters):
+        """First entry for an IP matching filters; only the IP's shard is searched"""
+        return self.query(self.shard_for_ip(ip_address)) \
+            .filter_by(ip_address=ip_address, **filters).first()
+
+    def create(self, **values):
+        """Insert and commit a new entry, returning it"""
+        if not self.enabled:
+            entry = StringEntry(**values)
+            db.session.add(entry)
+            db.session.commit()
+            return entry
+
+        shard = self.shard_for_ip(values['ip_address'])
+        session = self.session(shard)
+        # Next id congruent to the shard, computed inside the INSERT so that
+        # the shard's write lock makes it atomic
+        next_id = sa.select(
+            sa.func.coalesce(sa.func.max(StringEntry.id), shard) + self.count
+        ).scalar_subquery()
+        try:
+            result = session.execute(sa.insert(StringEntry).values(id=next_id, **values))
+            entry_id = result.inserted_primary_key[0]
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        return session.get(StringEntry, entry_id)
+
+    def commit(self, entry):
+        sa.orm.object_session(entry).commit()
+
+    def rollback(self, entry=None):
+        if entry is not None and sa.orm.object_session(entry) is not None:
+            sa.orm.object_session(entry).rollback()
+        else:
+            self.rollback_all()
+
+    def delete(self, entry):
+        session = sa.orm.object_session(entry)
+        session.delete(entry)
+        session.commit()
+
+    # ------ Scatter-gather ------
+
+    def gather(self, build, key=None, reverse=False, limit=None):
+        """
+        Run build(query) on every shard and merge the rows. When key is
+        given, rows are sorted by it; build should apply the same order and
+        limit so each shard returns only its best candidates.
+        """
+        rows = []
+        for shard in range(self.count):
+            rows.extend(build(self.query(shard)).all())
+        if key is not None and self.enabled:
+            rows.sort(key=key, reverse=reverse)
+        return rows[:limit] if limit is not None else rows
+
+    def stream(self, column, chunk_size=500):
+        """
+        Lazy version of gather() for every entry, newest first by column:
+        each shard is read with newest_first() and the shards are merged,
+        so memory stays bounded and no shard keeps a cursor open between
+        chunks.
+        """
+        streams = [newest_first(self.query(shard), column, chunk_size) for shard in range(self.count)]
+        if len(streams) == 1:
+            return streams[0]
+        return heapq.merge(*streams, key=lambda row: _order_key(row, column), reverse=True)
+
+    def count_rows(self, *criteria):
+        return sum(self.query(shard).filter(*criteria).count() for shard in range(self.count))
+
+    def _target_shards(self, ids=None, ip_address=None):
+        if ip_address is not None:
+            return [self.shard_for_ip(ip_address)]
+        if ids is not None:
+            return sorted({self.shard_for_id(entry_id) for entry_id in ids})
+        return range(self.count)
+
+    def update_where(self, criteria, values, ids=None, ip_address=None):
+        """One set-based UPDATE per involved shard; returns rows affected"""
+        return self._bulk(criteria, lambda q: q.update(values, synchronize_session=False),
+                          ids, ip_address)
+
+    def delete_where(self, criteria, ids=None, ip_address=None):
+        """One set-based DELETE per involved shard; returns rows affected"""
+        return self._bulk(criteria, lambda q: q.delete(synchronize_session=False),
+                          ids, ip_address)
+
+    def _bulk(self, criteria, operation, ids, ip_address):
+        shards = list(self._target_shards(ids, ip_address))
+        affected = 0
+        try:
+            for shard in shards:
+                affected += operation(self.query(shard).filter(*criteria))
+            # Not atomic across shards: each shard commits its own statement
+            for shard in shards:
+                self.session(shard).commit()
+        except Exception:
+            self.rollback_all()
+            raise
+        return affected
+
+    def rollback_all(self):
+        for session in self.sessions():
+            session.rollback()
+
+entry_shards = EntryShards()
+
+def _order_key(row, column):
+    # Same order as newest_first(): NULLs after every value, ties broken by id
+    value = getattr(row, column.key)
+    return (value is not None, value, row.id)
+
+def newest_first(query, column, chunk_size=500):
+    """
+    Iterate the rows of query ordered by (column, id) descending, using
+    short keyset-paginated queries: each chunk is a LIMIT query resuming
+    after the previous chunk's last row and is fetched in full, so no
+    cursor, and on SQLite no shared lock, is held while the caller
+    consumes the rows (e.g. while a streamed page renders). Rows whose
+    column is NULL come last.
+    """
+    pk = query.column_descriptions[0]['entity'].id
+    last = None
+    while True:
+        page = query.filter(column.isnot(None))
+        if last is not None:
+            page = page.filter(sa.or_(column < last[0], sa.and_(column == last[0], pk < last[1])))
+        rows = page.order_by(column.desc(), pk.desc()).limit(chunk_size).all()
+        yield from rows
+        if len(rows) < chunk_size:
+            break
+        last = (getattr(rows[-1], column.key), rows[-1].id)
+
+    last_id = None
+    while True:
+        page = query.filter(column.is_(None))
+        if last_id is not None:
+            page = page.filter(pk < last_id)
+        rows = page.order_by(pk.desc()).limit(chunk_size).all()
+        yield from rows
+        if len(rows) < chunk_size:
+            break
+        last_id = rows[-1].id
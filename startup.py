@@ -0,0 +1,100 @@
+"""
+Startup instrumentation and per-worker warm-up.
+
+Application startup is split in two phases:
+
+- one-time: schema creation/upgrade and search index setup. Idempotent and
+  safe to run once before forking workers (or skipped with INIT_DB=False
+  when the database is prepared separately).
+- per-worker: in-process state such as the consumed-id bitmap, background
+  jobs and the optional warm-up below, run by app.worker_init in each
+  serving process after the fork, so a new worker serves its first
+  request hot.
+"""
+
+import time
+from contextlib import contextmanager
+import sqlalchemy as sa
+from flask import render_template
+from models import db, StringEntry, StringPair
+from sharding import entry_shards
+
+# Templates rendered by the public and admin pages
+WARM_TEMPLATES = [
+    'index.html',
+    'result.html',
+    'no_match.html',
+    'error.html',
+    'admin_login.html',
+    'admin_dashboard.html',
+]
+
+class StartupTimer:
+    """Collects how long each startup phase takes"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.finished = None
+
+    @contextmanager
+    def phase(self, name):
+        phase_started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - phase_started
+
+    def finish(self):
+        self.finished = time.perf_counter()
+        return self.finished - self.started
+
+    def summary(self):
+        total = (self.finished or time.perf_counter()) - self.started
+        parts = ', '.join(f"{name} {seconds * 1000:.1f}ms" for name, seconds in self.phases.items())
+        return f"Startup took {total * 1000:.1f}ms ({parts})"
+
+    def as_dict(self):
+        return {name: round(seconds * 1000, 3) for name, seconds in self.phases.items()}
+
+def prime_connection_pool():
+    """Open as many connections as the pool keeps, then return them to it"""
+    size = getattr(db.engine.pool, 'size', lambda: 1)()
+    connections = []
+    try:
+        for _ in range(max(1, size)):
+            connection = db.engine.connect()
+            connection.exec_driver_sql('SELECT 1')
+            connections.append(connection)
+    finally:
+        for connection in connections:
+            connection.close()
+    return len(connections)
+
+def warm_up(app, logger=None):
+    """
+    Pay the cold-start costs before the worker takes traffic: the index
+    pages of the pattern lookup and the per-IP entry lookup, Jinja template
+    compilation and URL building, and database connections.
+    """
+    with app.app_context():
+        # Scans of the indexes behind the lookups (ix_string_pair_input_key and
+        # ix_string_entry_ip_address_input_key), pulling them into the page cache
+        patterns = db.session.scalar(sa.select(sa.func.count(StringPair.input_key)))
+        for engine in entry_shards.engines():
+            with engine.connect() as connection:
+                connection.scalar(sa.select(sa.func.count(StringEntry.input_key))
+                                  .where(StringEntry.ip_address > ''))
+
+        for name in WARM_TEMPLATES:
+            app.jinja_env.get_template(name)
+
+        # Exercise url_for and the render path once
+        with app.test_request_context('/'):
+            render_template('index.html')
+
+        connections = prime_connection_pool()
+
+    if logger:
+        logger.info(f"Warm-up complete: {patterns} patterns, {len(WARM_TEMPLATES)} templates, "
+                    f"{connections} pooled connections")
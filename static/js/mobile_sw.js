@@ -0,0 +1,128 @@
+// Service worker for the mobile pages: stale-while-revalidate caching of
+// the page shell, shared CSS/JS and GET API responses.
+//
+// Served from /mobile/sw.js so it controls everything under /mobile/.
+// Bump CACHE_VERSION when the precached URL list changes; content changes
+// are picked up by revalidation on their own.
+
+const CACHE_VERSION = 'v1';
+const CACHE_NAME = `mobile-shell-${CACHE_VERSION}`;
+
+const PRECACHE_URLS = [
+    '/mobile/main',
+    '/mobile/dashboard',
+    '/mobile/profile',
+    '/mobile/api/bootstrap',
+    '/static/css/mobile_styles.css',
+    '/static/js/mobile_ui.js'
+];
+
+// Third-party stylesheets and fonts the mobile templates load
+const CACHEABLE_ORIGINS = [
+    'https://fonts.googleapis.com',
+    'https://fonts.gstatic.com',
+    'https://cdnjs.cloudflare.com'
+];
+
+// Network fetches in progress, so concurrent requests for one URL share a fetch
+const inFlight = new Map();
+
+self.addEventListener('install', event => {
+    event.waitUntil(
+        caches.open(CACHE_NAME)
+            .then(cache => cache.addAll(PRECACHE_URLS))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(
+        caches.keys()
+            .then(names => Promise.all(
+                names.filter(name => name.startsWith('mobile-shell-') && name !== CACHE_NAME)
+                     .map(name => caches.delete(name))
+            ))
+            .then(() => self.clients.claim())
+    );
+});
+
+function isCacheable(url) {
+    if (url.origin === self.location.origin) {
+        return (url.pathname.startsWith('/mobile/') && url.pathname !== '/mobile/sw.js') ||
+               url.pathname.startsWith('/static/css/') ||
+               url.pathname.startsWith('/static/js/');
+    }
+    return CACHEABLE_ORIGINS.includes(url.origin);
+}
+
+function fetchAndCache(request) {
+    // Each caller gets its own clone; a response body can only be read once
+    const key = request.url;
+    if (inFlight.has(key)) {
+        return inFlight.get(key).then(response => response.clone());
+    }
+
+    const pending = fetch(request)
+        .then(response => {
+            // Opaque (cross-origin) responses report status 0 but are usable
+            if (response.ok || response.type === 'opaque') {
+                const copy = response.clone();
+                caches.open(CACHE_NAME).then(cache => cache.put(request, copy));
+            }
+            return response;
+        })
+        .finally(() => inFlight.delete(key));
+
+    inFlight.set(key, pending);
+    return pending.then(response => response.clone());
+}
+
+function staleWhileRevalidate(event) {
+    const request = event.request;
+    return caches.open(CACHE_NAME).then(cache =>
+        cache.match(request).then(cached => {
+            const network = fetchAndCache(request);
+            if (cached) {
+                // Answer from cache now; refresh it in the background
+                event.waitUntil(network.catch(() => {}));
+                return cached;
+            }
+            return network;
+        })
+    );
+}
+
+function clearApiCache() {
+    return caches.open(CACHE_NAME).then(cache =>
+        cache.keys().then(requests => Promise.all(
+            requests.filter(request => new URL(request.url).pathname.startsWith('/mobile/api/'))
+                    .map(request => cache.delete(request))
+        ))
+    );
+}
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    const url = new URL(request.url);
+
+    if (!isCacheable(url)) {
+        return;
+    }
+
+    if (request.method !== 'GET') {
+        // A successful update makes the cached API payloads stale
+        if (url.pathname.startsWith('/mobile/api/')) {
+            event.respondWith(
+                fetch(request).then(response => {
+                    if (response.ok) {
+                        event.waitUntil(clearApiCache());
+                    }
+                    return response;
+                })
+            );
+        }
+        return;
+    }
+
+    event.respondWith(staleWhileRevalidate(event));
+});
@@ -1,5 +1,13 @@
 // Mobile UI interactions for game application
 
+// Offline caching of the mobile shell and API responses (see mobile_sw.js)
+if ('serviceWorker' in navigator) {
+    window.addEventListener('load', function() {
+        navigator.serviceWorker.register('/mobile/sw.js', { scope: '/mobile/' })
+            .catch(error => console.warn('Service worker registration failed:', error));
+    });
+}
+
 document.addEventListener('DOMContentLoaded', function() {
     // Mobile navigation toggle
     const menuBtn = document.getElementById('menuBtn');
@@ -248,9 +256,37 @@ function validateForm(form) {
     return isValid;
 }
 
+// One request serves the stats, games and profile payloads for a page load
+const BOOTSTRAP_URL = '/mobile/api/bootstrap';
+const BOOTSTRAP_SECTIONS = {
+    '/mobile/api/stats': data => data.stats,
+    '/mobile/api/games': data => ({ games: data.games }),
+    '/mobile/api/profile': data => data.profile
+};
+let bootstrapRequest = null;
+
+/**
+ * Fetch the combined bootstrap payload once per page; concurrent callers share the request
+ * @return {Promise<Object>} - Resolves to {stats, games, profile}
+ */
+function loadBootstrap() {
+    if (!bootstrapRequest) {
+        bootstrapRequest = fetch(BOOTSTRAP_URL, { credentials: 'same-origin' })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`Bootstrap request failed: ${response.status}`);
+                }
+                return response.json();
+            });
+        // Allow a retry after a failure
+        bootstrapRequest.catch(() => { bootstrapRequest = null; });
+    }
+    return bootstrapRequest;
+}
+
 /**
  * Load data dynamically 
- * @param {string} url - URL to fetch data from
+ * @param {string} url - URL to fetch data from (stats, games and profile come from the bootstrap payload)
  * @param {Function} renderFunction - Function to render the data
  */
 function loadData(url, renderFunction) {
@@ -265,33 +301,29 @@ function loadData(url, renderFunction) {
         container.appendChild(loadingIndicator);
     }
     
-    // Simulate API call
-    setTimeout(() => {
-        // Mock data - replace with actual API call
-        const mockData = {
-            games: [
-                { id: 1, title: 'Adventure Quest', players: 4, status: 'active' },
-                { id: 2, title: 'Space Invaders', players: 2, status: 'waiting' },
-                { id: 3, title: 'Puzzle Master', players: 3, status: 'completed' }
-            ],
-            stats: {
-                gamesPlayed: 42,
-                wins: 28,
-                winRate: '67%',
-                points: 1250
+    let request;
+    if (!url || url === BOOTSTRAP_URL) {
+        request = loadBootstrap();
+    } else if (BOOTSTRAP_SECTIONS[url]) {
+        request = loadBootstrap().then(BOOTSTRAP_SECTIONS[url]);
+    } else {
+        request = fetch(url, { credentials: 'same-origin' }).then(response => response.json());
+    }
+    
+    request
+        .then(data => {
+            // Render the data
+            if (typeof renderFunction === 'function') {
+                renderFunction(data);
             }
-        };
-        
-        // Remove loading indicator
-        if (loadingIndicator.parentNode) {
-            loadingIndicator.parentNode.removeChild(loadingIndicator);
-        }
-        
-        // Render the data
-        if (typeof renderFunction === 'function') {
-            renderFunction(mockData);
-        }
-    }, 1500);
+        })
+        .catch(() => showToast('Could not load data. Please try again.', 'error'))
+        .finally(() => {
+            // Remove loading indicator
+            if (loadingIndicator.parentNode) {
+                loadingIndicator.parentNode.removeChild(loadingIndicator);
+            }
+        });
 }
 
 /**
@@ -0,0 +1,176 @@
+"""
+Coalescing and short-lived idempotency for duplicate submissions.
+
+Double-clicks, mobile retries and reloads send the same POST / several
+times. Submissions are keyed on (client IP, canonical input): while one
+is being processed, identical ones wait for its outcome instead of
+racing it, and for IDEMPOTENCY_TTL seconds afterwards a repeat is given
+the same outcome (the redirect to the same entry) without touching the
+database, so a retry storm costs one transaction. Using the entry ends
+the replay: the view route discards the submission's key when it claims
+or rejects the entry.
+
+The table is per process, holds at most IDEMPOTENCY_MAX_ENTRIES keys
+(oldest dropped first) and can be used from worker threads and, in ASGI
+mode, from the event loop.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+WAIT_TIMEOUT = 10.0  # seconds a duplicate waits before running on its own
+
+class _Slot:
+    """One submission: in flight until done is set, then replayable until expires"""
+    __slots__ = ('done', 'outcome', 'expires', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.outcome = None      # None after a failure: waiters run on their own
+        self.expires = None      # None: not replayable once done
+        self.waiters = []        # (loop, future) of duplicates waiting in ASGI mode
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+class SubmissionCoalescer:
+    def __init__(self, ttl=10.0, max_entries=10000, wait_timeout=WAIT_TIMEOUT):
+        self._slots = OrderedDict()
+        self._lock = threading.Lock()
+        self.wait_timeout = wait_timeout
+        self.executed = 0
+        self.coalesced = 0
+        self.replayed = 0
+        self.configure(ttl, max_entries)
+
+    def configure(self, ttl, max_entries):
+        with self._lock:
+            self.ttl = ttl
+            self.max_entries = max_entries
+            self.enabled = ttl > 0 and max_entries > 0
+            self._slots.clear()
+
+    # ------ Bookkeeping ------
+
+    def _claim(self, key, replayable):
+        """Return (slot, leader); the leader executes, everyone else waits on its slot"""
+        now = time.monotonic()
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is not None and slot.done.is_set():
+                if slot.expires is not None and slot.expires > now and replayable(slot.outcome):
+                    self.replayed += 1
+                    return slot, False
+                del self._slots[key]
+                slot = None
+            if slot is not None:
+                self.coalesced += 1
+                return slot, False
+
+            slot = _Slot()
+            self._slots[key] = slot
+            self.executed += 1
+            self._prune(now)
+            return slot, True
+
+    def _prune(self, now):
+        # Slots are kept in arrival order, so expired ones collect at the front
+        while self._slots:
+            oldest = next(iter(self._slots.values()))
+            if not oldest.done.is_set() or (oldest.expires is not None and oldest.expires > now):
+                break
+            self._slots.popitem(last=False)
+        # Hard bound; an evicted in-flight slot still wakes the waiters holding it
+        while len(self._slots) > self.max_entries:
+            self._slots.popitem(last=False)
+
+    def _finish(self, key, slot, outcome, keep):
+        with self._lock:
+            slot.outcome = outcome
+            if keep and self._slots.get(key) is slot:
+                slot.expires = time.monotonic() + self.ttl
+            elif self._slots.get(key) is slot:
+                del self._slots[key]
+            slot.done.set()
+            waiters, slot.waiters = slot.waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    def discard(self, key):
+        """Stop replaying a completed submission, e.g. once its entry has been used"""
+        with self._lock:
+            slot = self._slots.get(key)
+            # An in-flight slot is a newer submission (e.g. a reaccess reset)
+            if slot is not None and slot.done.is_set():
+                del self._slots[key]
+
+    # ------ Running ------
+
+    def run(self, key, execute, replayable=lambda outcome: True):
+        """
+        Call execute() unless an identical submission is in flight or was
+        just completed, in which case its outcome is returned instead.
+        Returns (outcome, shared); outcomes for which replayable() is false
+        are shared with concurrent duplicates only, not kept for the TTL.
+        """
+        if key is None or not self.enabled:
+            return execute(), False
+
+        slot, leader = self._claim(key, replayable)
+        if not leader:
+            if slot.done.wait(self.wait_timeout) and slot.outcome is not None:
+                return slot.outcome, True
+            return execute(), False
+
+        try:
+            outcome = execute()
+        except BaseException:
+            self._finish(key, slot, None, keep=False)
+            raise
+        self._finish(key, slot, outcome, keep=replayable(outcome))
+        return outcome, False
+
+    async def run_async(self, key, execute, replayable=lambda outcome: True):
+        """run() for the event loop: execute is a coroutine function and waiting doesn't block"""
+        if key is None or not self.enabled:
+            return await execute(), False
+
+        slot, leader = self._claim(key, replayable)
+        if not leader:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            with self._lock:
+                if slot.done.is_set():
+                    future.set_result(None)
+                else:
+                    slot.waiters.append((loop, future))
+            try:
+                await asyncio.wait_for(future, self.wait_timeout)
+            except asyncio.TimeoutError:
+                pass
+            if slot.done.is_set() and slot.outcome is not None:
+                return slot.outcome, True
+            return await execute(), False
+
+        try:
+            outcome = await execute()
+        except BaseException:
+            self._finish(key, slot, None, keep=False)
+            raise
+        self._finish(key, slot, outcome, keep=replayable(outcome))
+        return outcome, False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._slots),
+                'executed': self.executed,
+                'coalesced': self.coalesced,
+                'replayed': self.replayed,
+            }
+
+submissions = SubmissionCoalescer()
@@ -0,0 +1,28 @@
+import os
+import tempfile
+
+import pytest
+
+# The app logger is configured once per process; keep test records out of logs/
+os.environ.setdefault('LOG_DIR', tempfile.mkdtemp(prefix='string-transformer-tests-'))
+
+from app import create_app
+from models import db
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Factory for an app on a throwaway SQLite database; keyword args override the config"""
+    def make(**overrides):
+        # Flask-SQLAlchemy registers an (empty) metadata per bind on the shared
+        # db, and create_all() would look for those binds in every later app
+        for key in [key for key in db.metadatas if key is not None]:
+            del db.metadatas[key]
+        config = {
+            'TESTING': True,
+            'SECRET_KEY': 'test',
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+            'ROLLUP_INTERVAL': 0,
+        }
+        config.update(overrides)
+        return create_app(config)
+    return make
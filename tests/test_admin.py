@@ -0,0 +1,35 @@
+import pytest
+
+@pytest.fixture
+def admin(make_app):
+    client = make_app().test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+        session['username'] = 'admin'
+        session['is_admin'] = True
+    return client
+
+@pytest.mark.parametrize('params', [
+    {'ip': 5},
+    {'pattern': ['hello']},
+    {'date_from': 20240101},
+    {'ids': 5},
+    {'ids': [1, 'two']},
+    {'ids': [1.5]},
+    {'ids': [True]},
+    {'ids': {'1': 1}},
+    {'ip': '   '},
+])
+def test_bulk_rejects_invalid_selection(admin, params):
+    response = admin.post('/admin/entries/bulk', json={'action': 'disable_reaccess', **params})
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+def test_bulk_applies_valid_selection(admin):
+    admin.post('/', data={'input_string': 'hello'}, environ_base={'REMOTE_ADDR': '10.0.0.1'})
+
+    response = admin.post('/admin/entries/bulk', json={'action': 'enable_reaccess', 'ip': ' 10.0.0.1 '})
+    assert response.get_json() == {'success': True, 'action': 'enable_reaccess', 'affected': 1,
+                                   'message': 'Enable reaccess: 1 entries'}
+    response = admin.post('/admin/entries/bulk', data={'action': 'delete', 'ids': ['1']})
+    assert response.get_json()['affected'] == 1
@@ -0,0 +1,41 @@
+import logging
+
+import sqlalchemy as sa
+
+from models import db, StringPair
+from utils import backfill_pattern_keys, upgrade_schema
+
+def index_names(table):
+    return {index['name'] for index in sa.inspect(db.engine).get_indexes(table)}
+
+def test_upgrade_drops_redundant_ip_index(make_app):
+    with make_app().app_context():
+        with db.engine.begin() as conn:
+            conn.execute(sa.text("CREATE INDEX ix_string_entry_ip_address ON string_entry (ip_address)"))
+
+        upgrade_schema()
+
+        names = index_names('string_entry')
+        assert 'ix_string_entry_ip_address' not in names
+        assert 'ix_string_entry_ip_address_input_key' in names
+
+def test_pattern_key_goes_to_lowest_id(make_app, caplog):
+    with make_app().app_context():
+        # The seeded 'hello' pattern (#1) already has its key
+        with db.engine.begin() as conn:
+            conn.execute(sa.insert(StringPair), [
+                {'id': 2, 'input_pattern': 'BYE', 'output_pattern': 'one', 'input_key': None},
+                {'id': 3, 'input_pattern': 'bye', 'output_pattern': 'two', 'input_key': None},
+                {'id': 4, 'input_pattern': ' Bye ', 'output_pattern': 'three', 'input_key': None},
+                {'id': 5, 'input_pattern': 'HELLO', 'output_pattern': 'four', 'input_key': None},
+            ])
+
+        with caplog.at_level(logging.WARNING), db.engine.begin() as conn:
+            assert backfill_pattern_keys(conn) == 1
+
+        keys = dict(db.session.execute(sa.select(StringPair.id, StringPair.input_key)).all())
+        assert keys == {1: 'hello', 2: 'bye', 3: None, 4: None, 5: None}
+        warnings = [record.getMessage() for record in caplog.records if record.levelno == logging.WARNING]
+        assert len(warnings) == 3
+        assert any('#3' in message and '#2' in message for message in warnings)
+        assert any('#5' in message and '#1' in message for message in warnings)
@@ -0,0 +1,27 @@
+import pytest
+
+import search
+from sharding import entry_shards
+
+@pytest.mark.parametrize('query', [
+    '10.', '10.0', '192.168.1.', '192.168.1.20', '2001:db8:', 'fe80::1', '::1',
+])
+def test_address_prefixes_use_ip_lookup(query):
+    assert search.IP_PREFIX_RE.match(query)
+
+@pytest.mark.parametrize('query', [
+    'cafe.dead', 'add.bad', 'cafe:dead', 'hello', '10', '10..1', '1.2.3.4.5', '1234.5',
+])
+def test_text_is_not_treated_as_an_address(query):
+    assert not search.IP_PREFIX_RE.match(query)
+
+def test_hex_word_queries_reach_text_search(make_app):
+    app = make_app()
+    with app.app_context():
+        for ip, text in (('10.0.0.1', 'cafe.dead beef'), ('10.0.0.2', 'add.bad'), ('10.0.0.3', 'hello')):
+            entry_shards.create(input_string=text, transformed_string=text.upper(),
+                                ip_address=ip, accessed=False, reaccesible=False)
+
+        assert [entry.input_string for entry in search.search_entries('cafe.dead')] == ['cafe.dead beef']
+        assert [entry.input_string for entry in search.search_entries('add.bad')] == ['add.bad']
+        assert [entry.ip_address for entry in search.search_entries('10.0.0.')] == ['10.0.0.3', '10.0.0.2', '10.0.0.1']
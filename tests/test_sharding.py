@@ -0,0 +1,163 @@
+import pytest
+import sqlalchemy as sa
+
+import search
+from utils import reset_database
+from db_routing import READ_BIND, pin_primary
+from models import db, StringPair
+from sharding import entry_shards
+
+SHARDS = 3
+
+def ips_for_shard(shard, n):
+    """n distinct IPs that route to shard"""
+    ips = (f'10.0.{i // 256}.{i % 256}' for i in range(100000))
+    matching = (ip for ip in ips if entry_shards.shard_for_ip(ip) == shard)
+    return [next(matching) for _ in range(n)]
+
+def create_entry(ip_address, text='hello world'):
+    return entry_shards.create(input_string=text, transformed_string=text.upper(),
+                               ip_address=ip_address, accessed=False, reaccesible=False)
+
+@pytest.fixture
+def app(make_app):
+    app = make_app(ENTRY_SHARDS=SHARDS, READ_REPLICA=True)
+    with app.app_context():
+        yield app
+
+# ------ Id scheme ------
+
+def test_ids_are_congruent_to_their_shard(app):
+    for shard in range(SHARDS):
+        ids = [create_entry(ip).id for ip in ips_for_shard(shard, 3)]
+        # coalesce(max(id), shard) + N: the first id is shard + N, then steps of N
+        assert ids == [shard + SHARDS, shard + 2 * SHARDS, shard + 3 * SHARDS]
+
+def test_entries_are_found_by_id_and_ip(app):
+    ip = ips_for_shard(1, 1)[0]
+    entry_id = create_entry(ip).id
+
+    assert entry_shards.shard_for_id(entry_id) == 1
+    assert entry_shards.get(entry_id).ip_address == ip
+    assert entry_shards.find(ip).id == entry_id
+    for shard in (0, 2):
+        assert entry_shards.query(shard).filter_by(id=entry_id).first() is None
+
+def test_ids_continue_after_deletes(app):
+    ip = ips_for_shard(2, 1)[0]
+    first, second = create_entry(ip), create_entry(ip)
+    session = sa.orm.object_session(first)
+    session.delete(first)
+    session.commit()
+
+    assert create_entry(ip).id == second.id + SHARDS
+
+def test_reset_clears_every_shard(app):
+    for shard in range(SHARDS):
+        for ip in ips_for_shard(shard, 2):
+            create_entry(ip)
+    entry_shards.close_sessions()
+
+    assert reset_database(app)
+
+    for shard in range(SHARDS):
+        assert entry_shards.query(shard).count() == 0
+    ip = ips_for_shard(1, 1)[0]
+    assert create_entry(ip, text='after reset').id == 1 + SHARDS
+    if search.fts_enabled:
+        assert [entry.id for entry in search.search_entries('after')] == [1 + SHARDS]
+
+# ------ Read routing ------
+
+def engines_used(statement):
+    """Names ('primary' or 'read') of the engines statement runs on"""
+    names = {db.engines[None]: 'primary', db.engines[READ_BIND]: 'read'}
+    used = []
+
+    def record(conn, cursor, sql, parameters, context, executemany):
+        used.append(names[conn.engine])
+
+    for engine in names:
+        sa.event.listen(engine, 'before_cursor_execute', record)
+    try:
+        db.session.execute(statement)
+    finally:
+        for engine in names:
+            sa.event.remove(engine, 'before_cursor_execute', record)
+    return used
+
+def test_selects_go_to_the_read_bind(app):
+    assert engines_used(sa.select(StringPair)) == ['read']
+
+def test_pin_primary_sends_reads_to_primary(app):
+    pin_primary(db.session)
+    assert engines_used(sa.select(StringPair)) == ['primary']
+
+    # The pin ends with the session
+    db.session.remove()
+    assert engines_used(sa.select(StringPair)) == ['read']
+
+def test_flush_pins_session(app):
+    db.session.add(StringPair(input_pattern='pinned', output_pattern='PINNED'))
+    db.session.flush()
+
+    assert engines_used(sa.select(StringPair)) == ['primary']
+    # Reads on the primary see the uncommitted write
+    assert db.session.scalar(sa.select(StringPair.id).filter_by(input_pattern='pinned')) is not None
+
+def test_dml_pins_session(app):
+    assert engines_used(sa.update(StringPair).values(output_pattern='x').where(sa.false())) == ['primary']
+    assert engines_used(sa.select(StringPair)) == ['primary']
+
+def test_read_bind_rejects_writes(app):
+    with db.engines[READ_BIND].connect() as conn:
+        with pytest.raises(sa.exc.OperationalError):
+            conn.execute(sa.text("DELETE FROM string_pair"))
+
+# ------ Search index rebuild ------
+
+def trigger_names(engine):
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(sa.text("SELECT name FROM sqlite_master WHERE type = 'trigger'"))}
+
+@pytest.fixture
+def search_app(app):
+    if not search.setup_search_index():
+        pytest.skip("SQLite built without FTS5")
+    return app
+
+def test_missing_trigger_rebuilds_index_in_every_shard(search_app):
+    # An entry in each shard, written while its insert trigger is missing
+    for shard, engine in enumerate(entry_shards.engines()):
+        with engine.begin() as conn:
+            conn.execute(sa.text("DROP TRIGGER string_entry_fts_ai"))
+        create_entry(ips_for_shard(shard, 1)[0], text=f'unindexed{shard}')
+    assert search.search_entries('unindexed') == []
+
+    search.setup_search_index()
+
+    for engine in entry_shards.engines():
+        assert 'string_entry_fts_ai' in trigger_names(engine)
+    found = search.search_entries('unindexed')
+    assert sorted(entry_shards.shard_for_id(entry.id) for entry in found) == list(range(SHARDS))
+
+def test_missing_table_is_recreated_and_rebuilt(search_app):
+    create_entry(ips_for_shard(0, 1)[0], text='kept')
+    with db.engine.begin() as conn:
+        conn.execute(sa.text("DROP TABLE string_pair_fts"))
+        for suffix in ('ai', 'ad', 'au'):
+            conn.execute(sa.text(f"DROP TRIGGER string_pair_fts_{suffix}"))
+    db.session.add(StringPair(input_pattern='rebuilt pattern', output_pattern='REBUILT'))
+    db.session.commit()
+
+    search.setup_search_index()
+
+    assert [pair.input_pattern for pair in search.search_pairs('rebuilt')] == ['rebuilt pattern']
+    assert [entry.input_string for entry in search.search_entries('kept')] == ['kept']
+
+def test_intact_index_is_not_rebuilt(search_app, caplog):
+    create_entry(ips_for_shard(0, 1)[0], text='indexed')
+    search.setup_search_index()
+
+    assert not [record for record in caplog.records if 'Rebuilt search index' in record.getMessage()]
+    assert [entry.input_string for entry in search.search_entries('indexed')] == ['indexed']
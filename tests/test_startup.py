@@ -0,0 +1,49 @@
+import os
+
+import pytest
+import sqlalchemy as sa
+
+import app as app_package
+import search
+from app import worker_init
+from models import db
+
+@pytest.fixture
+def prepared(make_app, monkeypatch):
+    """Set up the database once, then start from a fresh process's search state"""
+    make_app()
+    if not search.fts_enabled:
+        pytest.skip("SQLite built without FTS5")
+    monkeypatch.setattr(search, 'fts_enabled', False)
+    return make_app
+
+def test_worker_detects_search_index_without_init_db(prepared):
+    app = prepared(INIT_DB=False)
+    worker_init(app)
+    assert search.fts_enabled
+
+def test_worker_falls_back_when_index_is_missing(prepared, caplog):
+    app = prepared(INIT_DB=False)
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.execute(sa.text("DROP TRIGGER string_pair_fts_ai"))
+
+    worker_init(app)
+    assert not search.fts_enabled
+    assert any('string_pair_fts' in record.getMessage() for record in caplog.records)
+
+def test_worker_init_runs_once_per_process(make_app, monkeypatch):
+    app = make_app()
+    calls = []
+    monkeypatch.setattr(app_package, 'init_worker', calls.append)
+
+    worker_init(app)
+    worker_init(app)
+    app.test_client().get('/')
+    assert calls == [app]
+
+    # A worker forked after the parent ran it runs it again, on its first request
+    pid = os.getpid()
+    monkeypatch.setattr(os, 'getpid', lambda: pid + 1)
+    app.test_client().get('/')
+    assert calls == [app, app]
@@ -0,0 +1,221 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import submissions
+from submissions import SubmissionCoalescer
+
+class Clock:
+    """Stand-in for time.monotonic that only moves when told to"""
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(submissions.time, 'monotonic', clock)
+    return clock
+
+def start_leader(coalescer, key, outcome='leader'):
+    """Run a submission on a thread that blocks until release is set"""
+    started, release = threading.Event(), threading.Event()
+    results = []
+
+    def execute():
+        started.set()
+        release.wait(5)
+        return outcome
+
+    thread = threading.Thread(target=lambda: results.append(coalescer.run(key, execute)))
+    thread.start()
+    assert started.wait(5)
+    return thread, release, results
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+def test_duplicate_waits_for_leader_outcome():
+    coalescer = SubmissionCoalescer(ttl=10)
+    leader, release, leader_results = start_leader(coalescer, 'key')
+
+    waiter_results = []
+    waiter = threading.Thread(target=lambda: waiter_results.append(
+        coalescer.run('key', lambda: pytest.fail("duplicate executed"))))
+    waiter.start()
+    wait_for(lambda: coalescer.stats()['coalesced'] == 1)
+    release.set()
+    leader.join(5)
+    waiter.join(5)
+
+    assert leader_results == [('leader', False)]
+    assert waiter_results == [('leader', True)]
+    stats = coalescer.stats()
+    assert (stats['executed'], stats['coalesced']) == (1, 1)
+
+def test_waiter_runs_on_its_own_after_timeout():
+    coalescer = SubmissionCoalescer(ttl=10, wait_timeout=0.05)
+    leader, release, _ = start_leader(coalescer, 'key')
+    try:
+        assert coalescer.run('key', lambda: 'own') == ('own', False)
+    finally:
+        release.set()
+        leader.join(5)
+
+def test_failure_lets_waiters_run_on_their_own():
+    coalescer = SubmissionCoalescer(ttl=10)
+    started, release = threading.Event(), threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("database is locked")
+
+    def lead():
+        with pytest.raises(RuntimeError):
+            coalescer.run('key', failing)
+
+    leader = threading.Thread(target=lead)
+    leader.start()
+    assert started.wait(5)
+
+    waiter_results = []
+    waiter = threading.Thread(target=lambda: waiter_results.append(coalescer.run('key', lambda: 'own')))
+    waiter.start()
+    wait_for(lambda: coalescer.stats()['coalesced'] == 1)
+    release.set()
+    leader.join(5)
+    waiter.join(5)
+
+    assert waiter_results == [('own', False)]
+    # The failure isn't replayed either
+    assert coalescer.run('key', lambda: 'again') == ('again', False)
+
+def test_replays_until_ttl_expires(clock):
+    coalescer = SubmissionCoalescer(ttl=10)
+    assert coalescer.run('key', lambda: 'first') == ('first', False)
+
+    clock.now += 9.9
+    assert coalescer.run('key', lambda: 'second') == ('first', True)
+
+    clock.now += 0.2
+    assert coalescer.run('key', lambda: 'second') == ('second', False)
+    assert coalescer.stats()['replayed'] == 1
+
+def test_expired_slots_are_pruned(clock):
+    coalescer = SubmissionCoalescer(ttl=10)
+    coalescer.run('a', lambda: 'a')
+    coalescer.run('b', lambda: 'b')
+
+    clock.now += 11
+    coalescer.run('c', lambda: 'c')
+    assert coalescer.stats()['entries'] == 1
+
+def test_table_is_bounded():
+    coalescer = SubmissionCoalescer(ttl=10, max_entries=2)
+    for key in 'abc':
+        coalescer.run(key, lambda: key)
+
+    assert coalescer.stats()['entries'] == 2
+    # The oldest key was dropped
+    assert coalescer.run('a', lambda: 'a again') == ('a again', False)
+
+def test_unreplayable_outcome_is_not_kept():
+    coalescer = SubmissionCoalescer(ttl=10)
+    replayable = lambda outcome: outcome != 'error'
+
+    assert coalescer.run('key', lambda: 'error', replayable) == ('error', False)
+    assert coalescer.run('key', lambda: 'ok', replayable) == ('ok', False)
+    assert coalescer.run('key', lambda: 'other', replayable) == ('ok', True)
+
+def test_discard_ends_replay_but_not_in_flight():
+    coalescer = SubmissionCoalescer(ttl=10)
+    coalescer.run('key', lambda: 'first')
+    coalescer.discard('key')
+    assert coalescer.run('key', lambda: 'second') == ('second', False)
+
+    leader, release, leader_results = start_leader(coalescer, 'other')
+    coalescer.discard('other')
+    release.set()
+    leader.join(5)
+    assert coalescer.run('other', lambda: 'again') == ('leader', True)
+
+def test_disabled_or_keyless_runs_every_time():
+    disabled = SubmissionCoalescer(ttl=0)
+    assert disabled.run('key', lambda: 1) == (1, False)
+    assert disabled.run('key', lambda: 2) == (2, False)
+
+    coalescer = SubmissionCoalescer(ttl=10)
+    assert coalescer.run(None, lambda: 1) == (1, False)
+    assert coalescer.run(None, lambda: 2) == (2, False)
+
+def test_run_async_coalesces_duplicates():
+    coalescer = SubmissionCoalescer(ttl=10)
+    calls = []
+
+    async def execute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 'leader'
+
+    async def main():
+        return await asyncio.gather(*(coalescer.run_async('key', execute) for _ in range(3)))
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert sorted(results) == [('leader', False), ('leader', True), ('leader', True)]
+
+def test_run_async_waiter_times_out():
+    coalescer = SubmissionCoalescer(ttl=10, wait_timeout=0.05)
+
+    async def slow():
+        await asyncio.sleep(0.5)
+        return 'leader'
+
+    async def own():
+        return 'own'
+
+    async def main():
+        leader = asyncio.ensure_future(coalescer.run_async('key', slow))
+        await asyncio.sleep(0)
+        waiter = await coalescer.run_async('key', own)
+        return waiter, await leader
+
+    assert asyncio.run(main()) == (('own', False), ('leader', False))
+
+def test_run_async_waits_for_threaded_leader():
+    # In ASGI mode a duplicate on the event loop may wait on a worker thread
+    coalescer = SubmissionCoalescer(ttl=10)
+    leader, release, _ = start_leader(coalescer, 'key')
+
+    async def main():
+        asyncio.get_running_loop().call_later(0.05, release.set)
+        return await coalescer.run_async('key', pytest.fail)
+
+    try:
+        assert asyncio.run(main()) == ('leader', True)
+    finally:
+        release.set()
+        leader.join(5)
+
+def test_used_entry_is_not_replayed(make_app):
+    # Default config: the consumed-id bitmap is off
+    client = make_app().test_client()
+
+    response = client.post('/', data={'input_string': 'hello'})
+    assert response.status_code == 302
+    view_url = response.headers['Location']
+    assert client.post('/', data={'input_string': 'Hello '}).headers['Location'] == view_url
+
+    assert b'OLLEH' in client.get(view_url).data
+
+    response = client.post('/', data={'input_string': 'hello'})
+    assert response.status_code == 200
+    assert b'already been accessed' in response.data
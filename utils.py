@@ -4,7 +4,13 @@ import os
 import sys
 from functools import wraps
 from flask import redirect, url_for, session, flash
-from models import db, User, StringPair, StringEntry
+from models import db, User, StringPair, StringEntry, canonical_key
+from search import setup_search_index, detect_search_index
+from consumed_ids import consumed_entries
+from submissions import submissions
+from rollups import rollup_job
+from db_routing import enable_wal
+from sharding import entry_shards
 
 # Logger will be imported from the main app
 logger = None
@@ -13,54 +19,227 @@ def set_logger(app_logger):
     global logger
     logger = app_logger
 
-def handle_database_migration():
-    """Handle database migration by dropping and recreating all tables."""
+def create_default_data():
+    """Create the default admin user and string pattern on an empty database."""
+    if User.query.first():
+        return
+    
+    admin = User(username="admin", is_admin=True)
+    admin.set_password("123")
+    db.session.add(admin)
+    
+    # Add some default string patterns
+    default_pair = StringPair(
+        input_pattern="hello",
+        output_pattern="OLLEH",
+        created_by=1
+    )
+    db.session.add(default_pair)
     try:
-        # Try to drop all tables first
-        db.drop_all()
-        logger.info("Dropped all tables during migration")
+        db.session.commit()
+        logger.info("Created default admin and string pattern")
     except Exception as e:
-        logger.error(f"Error dropping tables: {e}")
+        db.session.rollback()
+        logger.error(f"Error creating defaults: {e}")
+
+BACKFILL_BATCH_SIZE = 1000
+
+def set_keys(conn, table, keys):
+    """Write (id, key) pairs; plain SQL so backfilled rows keep their updated_at"""
+    conn.execute(
+        sqlalchemy.text(f"UPDATE {table.name} SET input_key = :key WHERE id = :row_id"),
+        [{'row_id': row_id, 'key': key} for row_id, key in keys]
+    )
+
+def backfill_canonical_keys(conn, table, source, batch_size=BACKFILL_BATCH_SIZE):
+    """
+    Compute the canonical key for rows that don't have one yet. The key
+    needs Unicode normalization, so it is computed here rather than in SQL.
+    Returns the number of rows updated.
+    """
+    updated = 0
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sqlalchemy.select(table.c.id, table.c[source])
+            .where(table.c.input_key.is_(None), table.c.id > last_id)
+            .order_by(table.c.id).limit(batch_size)
+        ).all()
+        if not rows:
+            return updated
+        
+        set_keys(conn, table, [(row_id, canonical_key(value)) for row_id, value in rows])
+        updated += len(rows)
+        last_id = rows[-1][0]
+
+def backfill_pattern_keys(conn):
+    """
+    Like backfill_canonical_keys, for the unique string_pair key. Patterns
+    that differed only in case or spacing now share a key: a key already
+    set stays with its row, otherwise the lowest id gets it. The others are
+    left without a key and logged for an admin to merge.
+    """
+    table = StringPair.__table__
+    owners = dict(conn.execute(
+        sqlalchemy.select(table.c.input_key, table.c.id).where(table.c.input_key.isnot(None))
+    ).all())
     
-    # Create all tables
-    db.create_all()
-    logger.info("Created all tables during migration")
+    rows = conn.execute(
+        sqlalchemy.select(table.c.id, table.c.input_pattern)
+        .where(table.c.input_key.is_(None)).order_by(table.c.id)
+    ).all()
+    keys = []
+    collisions = []
+    for row_id, pattern in rows:
+        key = canonical_key(pattern)
+        if key in owners:
+            collisions.append((row_id, pattern, key, owners[key]))
+        else:
+            owners[key] = row_id
+            keys.append((row_id, key))
+    
+    if keys:
+        set_keys(conn, table, keys)
+    
+    for row_id, pattern, key, owner in collisions:
+        logger.warning(f"String pair #{row_id} ({pattern!r}) has the canonical key {key!r} of "
+                       f"string pair #{owner}, which keeps it; #{row_id} will not match until merged")
+    return len(keys)
+
+def backfill_keys():
+    """
+    Fill canonical keys still missing after an upgrade, e.g. rows written
+    by workers of the previous release during a rolling restart.
+    """
+    with db.engine.begin() as conn:
+        pairs = backfill_pattern_keys(conn)
+    entries = 0
+    for engine in entry_shards.engines():
+        with engine.begin() as conn:
+            entries += backfill_canonical_keys(conn, StringEntry.__table__, 'input_string')
+    return {'ok': True, 'string_pairs': pairs, 'string_entries': entries}
+
+# Indexes made redundant by a later one, dropped by upgrade_schema
+# (the composite (ip_address, input_key) index leads with ip_address)
+OBSOLETE_INDEXES = {
+    'string_entry': ('ix_string_entry_ip_address',),
+}
+
+# Fill in columns that upgrade_schema adds to existing tables: SQL, or a
+# callable taking the connection
+COLUMN_BACKFILLS = {
+    ('string_entry', 'updated_at'): "UPDATE string_entry SET updated_at = created_at WHERE updated_at IS NULL",
+    ('string_entry', 'input_key'): lambda conn: backfill_canonical_keys(conn, StringEntry.__table__, 'input_string'),
+    ('string_pair', 'input_key'): backfill_pattern_keys,
+}
+
+def upgrade_schema(engine=None):
+    """
+    Add columns and indexes introduced after a table was first created and
+    drop indexes they made redundant. Never drops data; tables that don't
+    exist yet are left to db.create_all().
+    """
+    engine = engine or db.engine
+    inspector = sqlalchemy.inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    preparer = engine.dialect.identifier_preparer
     
-    # Create default admin user
-    admin = User.query.filter_by(username="admin").first()
-    if not admin:
-        admin = User(username="admin", is_admin=True)
-        admin.set_password("123")
-        db.session.add(admin)
+    with engine.begin() as conn:
+        backfills = []
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            
+            present = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in present:
+                    continue
+                
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(sqlalchemy.text(
+                    f"ALTER TABLE {preparer.format_table(table)} "
+                    f"ADD COLUMN {preparer.format_column(column)} {column_type}"
+                ))
+                logger.info(f"Added column {table.name}.{column.name}")
+                
+                backfill = COLUMN_BACKFILLS.get((table.name, column.name))
+                if backfill:
+                    backfills.append(backfill)
         
-        # Add some default string patterns
-        default_pair = StringPair(
-            input_pattern="hello",
-            output_pattern="OLLEH",
-            created_by=1
-        )
-        db.session.add(default_pair)
-        try:
-            db.session.commit()
-            logger.info("Created default admin and string pattern")
-        except Exception as e:
-            db.session.rollback()
-            logger.error(f"Error creating defaults: {e}")
+        # After all ALTERs, so backfills can rely on every column existing
+        for backfill in backfills:
+            if callable(backfill):
+                backfill(conn)
+            else:
+                conn.execute(sqlalchemy.text(backfill))
+    
+    for table in db.metadata.sorted_tables:
+        if table.name in existing_tables:
+            for index in table.indexes:
+                index.create(bind=engine, checkfirst=True)
+    
+    # After the indexes replacing them exist
+    with engine.begin() as conn:
+        for table_name, index_names in OBSOLETE_INDEXES.items():
+            if table_name not in existing_tables:
+                continue
+            present = {index['name'] for index in inspector.get_indexes(table_name)}
+            for name in index_names:
+                if name in present:
+                    conn.execute(sqlalchemy.text(f"DROP INDEX {preparer.quote(name)}"))
+                    logger.info(f"Dropped redundant index {name}")
 
 def initialize_database(app):
+    """
+    One-time database setup: create missing tables, add missing columns and
+    indexes, seed defaults and set up search. Idempotent and never drops
+    data, so it is safe to run before forking workers or from every worker.
+    Destructive resets are left to the maintenance utility.
+    """
     with app.app_context():
         try:
-            # First try to check if we need migration by testing if the reaccesible column exists
-            try:
-                StringEntry.query.filter_by(reaccesible=True).first()
-                logger.info("Database schema is up to date")
-            except (sqlite3.OperationalError, sqlalchemy.exc.OperationalError):
-                logger.warning("Need to migrate the database schema")
-                handle_database_migration()
-        except Exception as e:
-            logger.error(f"Error during database initialization: {e}")
-            # If anything goes wrong, just recreate everything
-            handle_database_migration()
+            if app.config.get('SQLITE_WAL', False):
+                logger.info(f"SQLite journal mode: {enable_wal(db.engine)}")
+            
+            db.create_all()
+            upgrade_schema()
+            
+            # Entry shards hold only the string_entry table
+            if entry_shards.enabled:
+                for engine in entry_shards.engines():
+                    StringEntry.__table__.create(bind=engine, checkfirst=True)
+                    upgrade_schema(engine)
+            
+            create_default_data()
+            
+            # Full-text search tables and their sync triggers
+            setup_search_index()
+            logger.info("Database schema is up to date")
+        except (sqlite3.OperationalError, sqlalchemy.exc.OperationalError) as e:
+            logger.error(f"Error during database initialization: {e}", exc_info=True)
+            raise
+        finally:
+            # Don't let pooled connections leak into forked workers
+            for engine in {db.engine, *entry_shards.engines()}:
+                engine.dispose()
+
+def init_worker(app):
+    """Per-worker startup: build in-process state from the database."""
+    with app.app_context():
+        if app.config.get('CONSUMED_BITMAP', False):
+            count = consumed_entries.load()
+            logger.info(f"Loaded {count} consumed entry ids into bitmap")
+        else:
+            consumed_entries.disable()
+        
+        # The index may have been set up by another process (INIT_DB=False)
+        detect_search_index()
+    
+    submissions.configure(app.config.get('IDEMPOTENCY_TTL', 10),
+                          app.config.get('IDEMPOTENCY_MAX_ENTRIES', 10000))
+    
+    # Keeps the dashboard rollups current; idempotent, so safe in every worker
+    rollup_job.start(app, app.config.get('ROLLUP_INTERVAL', 60))
 
 # Login required decorator
 def login_required(f):
@@ -88,7 +267,7 @@ def transform_string(input_string):
     Returns None if no pattern matches
     """
     # Check if there's a predefined pattern
-    pattern = StringPair.query.filter_by(input_pattern=input_string.lower()).first()
+    pattern = StringPair.query.filter_by(input_key=canonical_key(input_string)).first()
     if pattern:
         return pattern.output_pattern
     
@@ -108,6 +287,13 @@ def reset_database(app):
             
             # Recreate all tables
             db.create_all()
+            
+            # Entry shards hold only the string_entry table; db.drop_all()
+            # covers the primary database alone
+            if entry_shards.enabled:
+                for engine in entry_shards.engines():
+                    StringEntry.__table__.drop(bind=engine, checkfirst=True)
+                    StringEntry.__table__.create(bind=engine)
             print("All tables recreated successfully")
             
             # Create default admin user
@@ -125,6 +311,9 @@ def reset_database(app):
             
             db.session.commit()
             print("Default admin user and string pattern created successfully")
+            
+            # Dropping the content tables dropped the search triggers too
+            setup_search_index()
             return True
         except Exception as e:
             db.session.rollback()
@@ -201,7 +390,7 @@ def fix_routes(app):
 def fix_critical_templates(app):
     """Fix critical templates"""
     print("Checking for critical template issues...")
-    templates_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates')
+    templates_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
     
     critical_templates = [
         'index.html',
@@ -3,10 +3,14 @@ os.environ['SECRET_KEY'] = 'your_secret_key_here'
 os.environ['DATABASE_URI'] = 'sqlite:///strings.db'
 os.environ['SECURE_COOKIES'] = 'True'
 
-from app import create_app
+from app import create_app, worker_init
 
-# This file is used by WSGI servers like Gunicorn
+# This file is used by WSGI servers like Waitress and Gunicorn
 application = create_app()
 
+# Warm up before the server accepts traffic. Waitress serves from this
+# process; workers forked from it (Gunicorn --preload) run it again
+worker_init(application)
+
 if __name__ == "__main__":
     application.run()